@@ -29,10 +29,77 @@ class KafkaCharm(CharmBase):
         self.snap.install()
         self.snap.start_snap_service(snap_service="kafka")
 ```
+
+Service transitions are state-aware. `KafkaSnap` keeps a snapshot of the service states read
+from the snapd `apps` endpoint, and skips `start`/`stop` calls for services already in the
+target state. Restarts requested with `coalesce=True` are recorded and performed once, when
+`flush_restarts` is called, typically at the end of the hook:
+
+```python
+
+class KafkaCharm(CharmBase):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.snap = KafkaSnap()
+
+        self.framework.observe(getattr(self.on, "config_changed"), self._on_config_changed)
+        self.framework.observe(self.framework.on.commit, self._on_commit)
+
+    def _on_config_changed(self, event):
+        self.snap.restart_snap_service(snap_service="kafka", coalesce=True)
+
+    def _on_commit(self, event):
+        self.snap.flush_restarts()
+```
+
+`RollingRestartCoordinator` restarts the local service only while the cluster is fully
+replicated, and blocks until the under-replicated partitions are back to zero afterwards.
+Running it under a cluster-wide lock (e.g the `rolling_ops` library) restarts one unit at a time:
+
+```python
+
+    def _restart(self, event):
+        coordinator = RollingRestartCoordinator(
+            kafka_snap=self.snap,
+            bootstrap_server="10.0.0.1:9092",
+            opts=[f"-Djava.security.auth.login.config={JAAS_PATH}"],
+            command_config=f"{self.snap.snap_config_path}/client.properties",
+        )
+        if coordinator.restart(snap_service="kafka"):
+            logger.info(f"restart took {coordinator.timings[-1].total}s")
+        else:
+            event.defer()
+```
+
+The same coordinator refreshes the snap across the cluster. One unit creates a cohort, so every
+unit gets the same revision, and shares its key (e.g in the peer relation). Every unit downloads
+that revision as soon as it sees the key, then switches to it in turn, under the same lock:
+
+```python
+
+    def _on_upgrade_charm(self, event):
+        if self.unit.is_leader():
+            self.peer_relation.data[self.app]["cohort"] = self.snap.create_cohort()
+
+    def _on_peer_relation_changed(self, event):
+        cohort = self.peer_relation.data[self.app].get("cohort")
+        if cohort and self.snap.prefetch(cohort):
+            self.on[self.restart.name].acquire_lock.emit()
+
+    def _restart(self, event):
+        ...
+        if not coordinator.refresh(cohort=cohort):
+            event.defer()
+```
 """
 import logging
+import os
+import re
+import shlex
+import shutil
 import subprocess
-from typing import List
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 
 from charms.operator_libs_linux.v0 import apt
 from charms.operator_libs_linux.v1 import snap
@@ -47,10 +114,17 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 4
+LIBPATCH = 16
 
 
 SNAP_CONFIG_PATH = "/var/snap/charmed-kafka/common/"
+SNAP_BIN_PATH = "/snap/bin"
+SNAP_CHANNEL = "rock/edge"
+SNAPD_BIN = "/usr/bin/snap"
+SNAP_DOWNLOAD_PATH = "/var/cache/charm-kafka/snaps"
+APT_MAX_AGE = 3600
+
+PARTITION_MATCHER = re.compile(r"\bPartition:\s*\d+")
 
 
 class KafkaSnap:
@@ -58,32 +132,172 @@ class KafkaSnap:
 
     def __init__(self) -> None:
         self.snap_config_path = SNAP_CONFIG_PATH
-        self.kafka = snap.SnapCache()["kafka"]
+        self.kafka = snap.get_cache()["kafka"]
+        self._services: Optional[Dict[str, Dict]] = None
+        self._pending_restarts: Set[str] = set()
+        self.install_reason = ""
+
+    def _installed_at_channel(self) -> bool:
+        """Checks with a single snapd query whether the Kafka snap is installed at `SNAP_CHANNEL`.
+
+        The outcome of the check is recorded in `install_reason`.
+        """
+        if not os.path.isfile(SNAPD_BIN):
+            self.install_reason = "snapd not installed"
+            return False
+
+        try:
+            info = snap.SnapClient().get_installed_snap("kafka")
+        except snap.SnapAPIError as e:
+            self.install_reason = f"kafka snap not installed - {e.message}"
+            return False
+
+        channel = info.get("tracking-channel") or info.get("channel")
+        if channel != SNAP_CHANNEL:
+            self.install_reason = f"kafka snap tracking {channel}, expected {SNAP_CHANNEL}"
+            return False
+
+        self.install_reason = f"kafka snap revision {info['revision']} installed at {channel}"
+        return True
 
     def install(self) -> bool:
         """Loads the Kafka snap from LP, returning a StatusBase for the Charm to set.
 
+        Returns early if the snap is already installed at the expected channel, and refreshes it
+        to `SNAP_CHANNEL` if it is installed at another channel. Otherwise, the apt cache is
+        only updated if snapd needs to be installed, and is older than `APT_MAX_AGE` seconds or
+        its sources changed. The reason for skipping or not skipping the install is recorded in
+        `install_reason`.
+
         Returns:
             True if successfully installed. False otherwise.
         """
         try:
-            apt.update()
-            apt.add_package("snapd")
-            cache = snap.SnapCache()
+            if self._installed_at_channel():
+                logger.debug(f"Skipping install - {self.install_reason}")
+                if not self.kafka.present:
+                    snap.invalidate_cache()
+                    self.kafka = snap.get_cache()["kafka"]
+                return True
+
+            logger.info(f"Installing - {self.install_reason}")
+            if not os.path.isfile(SNAPD_BIN):
+                apt.update(max_age=APT_MAX_AGE)
+                apt.add_package("snapd")
+
+            cache = snap.get_cache()
             kafka = cache["kafka"]
 
             if not kafka.present:
-                kafka.ensure(snap.SnapState.Latest, channel="rock/edge")
+                (kafka,) = snap.add_many(
+                    ["kafka"], channel=SNAP_CHANNEL, classic=kafka.confinement == "classic"
+                )
+            else:
+                # installed, but tracking another channel
+                kafka.ensure(snap.SnapState.Present, channel=SNAP_CHANNEL)
 
             self.kafka = kafka
             return True
-        except (snap.SnapError, apt.PackageNotFoundError) as e:
+        except (snap.SnapError, apt.PackageError, apt.PackageNotFoundError) as e:
+            logger.error(str(e))
+            return False
+
+    def create_cohort(self) -> Optional[str]:
+        """Creates a snapd cohort for the Kafka snap, to be shared with every unit.
+
+        Returns:
+            The cohort key if successfully created. None otherwise.
+        """
+        try:
+            return self.kafka.create_cohort()
+        except snap.SnapError as e:
+            logger.error(str(e))
+            return None
+
+    def prefetch(self, cohort: str) -> bool:
+        """Downloads the cohort revision of the Kafka snap, without installing it.
+
+        Can run on every unit at once, as soon as the cohort key is known, so that the download
+        is not part of the rolling refresh done by `switch_revision`.
+
+        Args:
+            cohort: the cohort key created with `create_cohort`
+
+        Returns:
+            True if the snap was successfully downloaded. False otherwise.
+        """
+        try:
+            os.makedirs(SNAP_DOWNLOAD_PATH, exist_ok=True)
+            self.kafka.download(SNAP_DOWNLOAD_PATH, channel=SNAP_CHANNEL, cohort=cohort)
+            return True
+        except (OSError, snap.SnapError) as e:
             logger.error(str(e))
             return False
 
+    def switch_revision(self, cohort: str) -> bool:
+        """Refreshes the Kafka snap to the revision downloaded by `prefetch`.
+
+        Falls back to refreshing from the store if nothing was downloaded. The snap services are
+        restarted by snapd, and the downloaded files are removed afterwards.
+
+        Args:
+            cohort: the cohort key the snap was downloaded with
+
+        Returns:
+            True if the snap was successfully refreshed. False otherwise.
+        """
+        try:
+            try:
+                downloaded = self.kafka.get_downloaded(SNAP_DOWNLOAD_PATH)
+            except snap.SnapError:
+                logger.warning("No prefetched kafka snap, refreshing from the store")
+                self.kafka.ensure(snap.SnapState.Present, channel=SNAP_CHANNEL, cohort=cohort)
+            else:
+                self.kafka.install_downloaded(*downloaded, channel=SNAP_CHANNEL, cohort=cohort)
+                for path in downloaded:
+                    os.remove(path)
+        except (OSError, snap.SnapError) as e:
+            logger.error(str(e))
+            return False
+
+        self._services = None
+        return True
+
+    def get_service_states(self, refresh: bool = False) -> Dict[str, Dict]:
+        """Gets the state of the snap services, as reported by the snapd `apps` endpoint.
+
+        The states are read once and cached, and kept up to date by the service transitions
+        made through this class.
+
+        Args:
+            refresh: re-read the service states from snapd, ignoring the cached snapshot
+
+        Returns:
+            Dict of service name to service state, e.g `{"kafka": {"active": True, ...}}`
+        """
+        if self._services is None or refresh:
+            self._services = self.kafka.services
+
+        return self._services
+
+    def _is_active(self, snap_service: str) -> Optional[bool]:
+        """Checks whether a snap service is active, if its state is known."""
+        service = self.get_service_states().get(snap_service)
+        if service is None:
+            return None
+
+        return service["active"]
+
+    def _set_active(self, snap_service: str, active: bool) -> None:
+        """Records the new state of a snap service in the cached snapshot."""
+        if self._services is not None and snap_service in self._services:
+            self._services[snap_service]["active"] = active
+
     def start_snap_service(self, snap_service: str) -> bool:
         """Starts snap service process.
 
+        Does nothing if the service is already active.
+
         Args:
             snap_service: The desired service to run on the unit
                 `kafka` or `zookeeper`
@@ -91,8 +305,13 @@ class KafkaSnap:
         Returns:
             True if service successfully starts. False otherwise.
         """
+        if self._is_active(snap_service):
+            logger.debug(f"Service {snap_service} already active, skipping start")
+            return True
+
         try:
             self.kafka.start(services=[snap_service])
+            self._set_active(snap_service, True)
             return True
         except snap.SnapError as e:
             logger.exception(str(e))
@@ -101,6 +320,8 @@ class KafkaSnap:
     def stop_snap_service(self, snap_service: str) -> bool:
         """Stops snap service process.
 
+        Does nothing if the service is already inactive.
+
         Args:
             snap_service: The desired service to stop on the unit
                 `kafka` or `zookeeper`
@@ -108,34 +329,116 @@ class KafkaSnap:
         Returns:
             True if service successfully stops. False otherwise.
         """
+        if self._is_active(snap_service) is False:
+            logger.debug(f"Service {snap_service} already inactive, skipping stop")
+            self._pending_restarts.discard(snap_service)
+            return True
+
         try:
             self.kafka.stop(services=[snap_service])
+            self._set_active(snap_service, False)
+            self._pending_restarts.discard(snap_service)
             return True
         except snap.SnapError as e:
             logger.exception(str(e))
             return False
 
-    def restart_snap_service(self, snap_service: str) -> bool:
+    def restart_snap_service(self, snap_service: str, coalesce: bool = False) -> bool:
         """Restarts snap service process.
 
         Args:
             snap_service: The desired service to run on the unit
                 `kafka` or `zookeeper`
+            coalesce: only record the restart request, to be performed once by `flush_restarts`
 
         Returns:
             True if service successfully restarts. False otherwise.
         """
+        if coalesce:
+            logger.debug(f"Queueing restart of service {snap_service}")
+            self._pending_restarts.add(snap_service)
+            return True
+
         try:
             self.kafka.restart(services=[snap_service])
+            self._set_active(snap_service, True)
+            self._pending_restarts.discard(snap_service)
             return True
         except snap.SnapError as e:
             logger.exception(str(e))
             return False
 
+    def wait_for_service(
+        self, snap_service: str, active: bool = True, timeout: float = 60
+    ) -> bool:
+        """Waits until a snap service is active, or inactive.
+
+        Args:
+            snap_service: The desired service to wait for on the unit
+                `kafka` or `zookeeper`
+            active: whether to wait for the service to be active, or inactive
+            timeout: the maximum time to wait, in seconds
+
+        Returns:
+            True if the service reached the state before the timeout. False otherwise.
+        """
+        try:
+            self.kafka.wait_for_services(
+                {snap_service: "active" if active else "inactive"}, timeout=timeout
+            )
+            self._set_active(snap_service, active)
+            return True
+        except snap.SnapError as e:
+            logger.error(str(e))
+            return False
+
+    def flush_restarts(self) -> bool:
+        """Performs the restarts queued with `restart_snap_service(..., coalesce=True)`.
+
+        Each queued service is restarted once, regardless of how many restarts were requested.
+
+        Returns:
+            True if all queued services successfully restart. False otherwise.
+        """
+        success = True
+        for snap_service in sorted(self._pending_restarts):
+            success = self.restart_snap_service(snap_service) and success
+
+        return success
+
+    @staticmethod
+    def _build_bin_command(
+        bin_keyword: str, bin_args: List[str], opts: List[str]
+    ) -> Tuple[List[str], Dict[str, str]]:
+        """Builds the argv and environment for a kafka bin command.
+
+        The snap app is resolved to an absolute path so that `subprocess` can use
+        `posix_spawn` instead of forking a `/bin/sh` to interpret the command.
+
+        Args:
+            bin_keyword: the kafka shell script to run
+                e.g `configs`, `topics` etc
+            bin_args: the command args, one argument per item
+            opts: the desired `KAFKA_OPTS` env var values for the command
+
+        Returns:
+            Tuple of the command argv and the environment to run it with
+        """
+        app = f"kafka.{bin_keyword}"
+        executable = shutil.which(app) or os.path.join(SNAP_BIN_PATH, app)
+
+        env = dict(os.environ)
+        env["KAFKA_OPTS"] = " ".join(opts)
+
+        return [executable, *bin_args], env
+
     @staticmethod
     def run_bin_command(bin_keyword: str, bin_args: List[str], opts: List[str]) -> str:
         """Runs kafka bin command with desired args.
 
+        The args are joined with spaces and interpreted by `/bin/sh`, so one item can hold
+        several shell-quoted args. Use `run_bin_argv` to pass the args verbatim, without a shell.
+
         Args:
             bin_keyword: the kafka shell script to run
                 e.g `configs`, `topics` etc
@@ -148,16 +451,270 @@ class KafkaSnap:
         Raises:
             `subprocess.CalledProcessError`: if the error returned a non-zero exit code
         """
-        args_string = " ".join(bin_args)
-        opts_string = " ".join(opts)
-        command = f"KAFKA_OPTS={opts_string} kafka.{bin_keyword} {args_string}"
+        (executable,), env = KafkaSnap._build_bin_command(bin_keyword, [], opts)
+        command = " ".join([shlex.quote(executable), *bin_args])
+
+        try:
+            output = subprocess.check_output(
+                command, env=env, stderr=subprocess.PIPE, universal_newlines=True, shell=True
+            )
+            logger.debug(f"{output=}")
+            return output
+        except subprocess.CalledProcessError as e:
+            logger.debug(f"cmd failed - cmd={e.cmd}, stdout={e.stdout}, stderr={e.stderr}")
+            raise e
+
+    @staticmethod
+    def run_bin_argv(bin_keyword: str, bin_args: List[str], opts: List[str]) -> str:
+        """Runs kafka bin command with desired args, without a shell.
+
+        Args:
+            bin_keyword: the kafka shell script to run
+                e.g `configs`, `topics` etc
+            bin_args: the command args, one argument per item, passed verbatim
+            opts (optional): the desired `KAFKA_OPTS` env var values for the command
+
+        Returns:
+            String of kafka bin command output
+
+        Raises:
+            `subprocess.CalledProcessError`: if the error returned a non-zero exit code
+        """
+        command, env = KafkaSnap._build_bin_command(bin_keyword, bin_args, opts)
 
         try:
+            # close_fds=False lets subprocess take the posix_spawn fast path where available
             output = subprocess.check_output(
-                command, stderr=subprocess.PIPE, universal_newlines=True, shell=True
+                command,
+                env=env,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                close_fds=False,
             )
             logger.debug(f"{output=}")
             return output
         except subprocess.CalledProcessError as e:
             logger.debug(f"cmd failed - cmd={e.cmd}, stdout={e.stdout}, stderr={e.stderr}")
             raise e
+
+    @staticmethod
+    def run_bin_commands(commands: List[Tuple[str, List[str]]], opts: List[str]) -> List[str]:
+        """Runs a batch of kafka bin commands concurrently.
+
+        All commands are spawned before any of them is waited on, so the JVM start-up
+        cost of each command overlaps with the others.
+
+        Args:
+            commands: list of `(bin_keyword, bin_args)` pairs to run, with the args passed
+                verbatim as in `run_bin_argv`
+            opts (optional): the desired `KAFKA_OPTS` env var values for every command
+
+        Returns:
+            List of kafka bin command outputs, in the same order as `commands`
+
+        Raises:
+            `subprocess.CalledProcessError`: if any command returned a non-zero exit code
+        """
+        processes = []
+        for bin_keyword, bin_args in commands:
+            command, env = KafkaSnap._build_bin_command(bin_keyword, bin_args, opts)
+            process = subprocess.Popen(
+                command,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                close_fds=False,
+            )
+            processes.append((command, process))
+
+        outputs = []
+        error = None
+        for command, process in processes:
+            stdout, stderr = process.communicate()
+            if process.returncode and error is None:
+                logger.debug(f"cmd failed - cmd={command}, stdout={stdout}, stderr={stderr}")
+                error = subprocess.CalledProcessError(
+                    process.returncode, command, output=stdout, stderr=stderr
+                )
+            outputs.append(stdout)
+
+        if error:
+            raise error
+
+        logger.debug(f"{outputs=}")
+        return outputs
+
+
+class RestartTiming(NamedTuple):
+    """Durations in seconds of the phases of a rolling restart on a unit."""
+
+    service: str
+    pre_check: float
+    restart: float
+    recovery: float
+
+    @property
+    def total(self) -> float:
+        """Returns the total duration of the restart."""
+        return self.pre_check + self.restart + self.recovery
+
+
+class RollingRestartCoordinator:
+    """Restarts a local snap service without dropping the cluster below full replication.
+
+    Before restarting, the coordinator waits until there are no under-replicated or unavailable
+    partitions, so that a previous restart on another unit has fully recovered. After restarting,
+    it waits for the same condition again, so the next unit only proceeds once this one has
+    rejoined every ISR and all partitions have an elected leader.
+
+    The active controller is not queried. Its stability is inferred instead: partitions only
+    get a leader through a working controller, so no unavailable partitions for `stable_checks`
+    consecutive polls is taken to mean that no controller failover is in progress.
+
+    `refresh` switches the snap to a prefetched cohort revision with the same checks.
+
+    Cross-unit ordering is not handled here; callers are expected to hold a cluster-wide lock
+    while calling `restart` or `refresh`.
+
+    `poll_interval`, `stable_checks` and `timeout` trade restart throughput against safety, and
+    the duration of every phase is recorded in `timings`.
+    """
+
+    def __init__(
+        self,
+        kafka_snap: KafkaSnap,
+        bootstrap_server: str,
+        opts: List[str],
+        command_config: Optional[str] = None,
+        timeout: float = 600,
+        poll_interval: float = 5,
+        stable_checks: int = 3,
+    ) -> None:
+        self.kafka_snap = kafka_snap
+        self.bootstrap_server = bootstrap_server
+        self.opts = opts
+        self.command_config = command_config
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.stable_checks = stable_checks
+        self.timings: List[RestartTiming] = []
+
+    def _describe_args(self, flag: str) -> List[str]:
+        """Builds the `topics --describe` args filtering for the given partition flag."""
+        args = ["--bootstrap-server", self.bootstrap_server, "--describe", flag]
+        if self.command_config:
+            args += ["--command-config", self.command_config]
+
+        return args
+
+    @staticmethod
+    def _count_partitions(output: str) -> int:
+        """Counts the partition lines in the output of `topics --describe`."""
+        return len(PARTITION_MATCHER.findall(output))
+
+    def get_partition_health(self) -> Tuple[int, int]:
+        """Gets the number of under-replicated and unavailable partitions in the cluster.
+
+        Returns:
+            Tuple of the under-replicated and unavailable partition counts
+
+        Raises:
+            `subprocess.CalledProcessError`: if the cluster could not be described
+        """
+        under_replicated, unavailable = self.kafka_snap.run_bin_commands(
+            commands=[
+                ("topics", self._describe_args("--under-replicated-partitions")),
+                ("topics", self._describe_args("--unavailable-partitions")),
+            ],
+            opts=self.opts,
+        )
+
+        return self._count_partitions(under_replicated), self._count_partitions(unavailable)
+
+    def wait_until_stable(self) -> bool:
+        """Waits until the cluster reports no under-replicated or unavailable partitions.
+
+        The cluster must report healthy for `stable_checks` consecutive polls, so that a
+        controller failover or leader re-election in progress is not mistaken for recovery.
+
+        Returns:
+            True if the cluster became stable before `timeout`. False otherwise.
+        """
+        deadline = time.monotonic() + self.timeout
+        healthy_checks = 0
+
+        while True:
+            try:
+                under_replicated, unavailable = self.get_partition_health()
+            except subprocess.CalledProcessError:
+                under_replicated = unavailable = -1
+
+            if under_replicated == 0 and unavailable == 0:
+                healthy_checks += 1
+                if healthy_checks >= self.stable_checks:
+                    return True
+            else:
+                logger.debug(f"Waiting for cluster - {under_replicated=}, {unavailable=}")
+                healthy_checks = 0
+
+            if time.monotonic() + self.poll_interval > deadline:
+                return False
+
+            time.sleep(self.poll_interval)
+
+    def _run_when_stable(self, name: str, action) -> bool:
+        """Runs an action once the cluster is stable, then waits for the cluster to recover."""
+        start = time.monotonic()
+        if not self.wait_until_stable():
+            logger.error(f"Cluster not stable, skipping {name}")
+            return False
+
+        pre_check_end = time.monotonic()
+        if not action():
+            return False
+
+        restart_end = time.monotonic()
+        recovered = self.wait_until_stable()
+        recovery_end = time.monotonic()
+
+        timing = RestartTiming(
+            service=name,
+            pre_check=pre_check_end - start,
+            restart=restart_end - pre_check_end,
+            recovery=recovery_end - restart_end,
+        )
+        self.timings.append(timing)
+        logger.info(f"Ran {name} - {timing}")
+
+        if not recovered:
+            logger.error(f"Cluster did not recover after {name}")
+
+        return recovered
+
+    def restart(self, snap_service: str = "kafka") -> bool:
+        """Restarts the local snap service once the cluster is safe to restart.
+
+        Args:
+            snap_service: The desired service to restart on the unit
+                `kafka` or `zookeeper`
+
+        Returns:
+            True if the service restarted and the cluster recovered. False otherwise.
+        """
+        return self._run_when_stable(
+            snap_service, lambda: self.kafka_snap.restart_snap_service(snap_service=snap_service)
+        )
+
+    def refresh(self, cohort: str) -> bool:
+        """Switches the local Kafka snap to the cohort revision once the cluster is stable.
+
+        The revision should have been downloaded beforehand with `KafkaSnap.prefetch`.
+
+        Args:
+            cohort: the cohort key shared by every unit
+
+        Returns:
+            True if the snap refreshed and the cluster recovered. False otherwise.
+        """
+        return self._run_when_stable("refresh", lambda: self.kafka_snap.switch_revision(cohort))
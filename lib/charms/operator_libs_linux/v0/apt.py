@@ -22,10 +22,10 @@ A sane default configuration is attainable through nothing more than instantiati
 appropriate classes. `DebianPackage` objects provide information about the architecture, version,
 name, and status of a package.
 
-`DebianPackage` will try to look up a package either from `dpkg -L` or from `apt-cache` when
-provided with a string indicating the package name. If it cannot be located, `PackageNotFoundError`
-will be returned, as `apt` and `dpkg` otherwise return `100` for all errors, and a meaningful error
-message if the package is not known is desirable.
+`DebianPackage` will try to look up a package either from the dpkg status database or from
+`apt-cache` when provided with a string indicating the package name. If it cannot be located,
+`PackageNotFoundError` will be returned, as `apt` and `dpkg` otherwise return `100` for all errors,
+and a meaningful error message if the package is not known is desirable.
 
 To install packages with convenience methods:
 
@@ -41,6 +41,13 @@ except PackageError as e:
     logger.error("could not install package. Reason: %s", e.message)
 ````
 
+A version, or a constraint on the version, may also be given. The most recent version which
+satisfies the constraint is installed, unless one is installed already:
+
+```python
+apt.add_package("openjdk-17-jre-headless", version=">= 17.0.6, << 18")
+```
+
 To find details of a specific package:
 
 ```python
@@ -102,16 +109,27 @@ if "deb-us.archive.ubuntu.com-xenial" not in repositories:
 ```
 """
 
-import fileinput
+import base64
+import binascii
+import functools
 import glob
+import hashlib
+import json
 import logging
+import mmap
+import operator
 import os
+import platform
 import re
 import subprocess
+import time
+import urllib.error
+import urllib.request
 from collections.abc import Mapping
+from contextlib import contextmanager
 from enum import Enum
 from subprocess import PIPE, CalledProcessError, check_call, check_output
-from typing import Iterable, List, Optional, Tuple, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
@@ -124,11 +142,40 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 7
+LIBPATCH = 19
 
 
 VALID_SOURCE_TYPES = ("deb", "deb-src")
 OPTIONS_MATCHER = re.compile(r"\[.*?\]")
+DPKG_STATUS_PATH = "/var/lib/dpkg/status"
+APT_LISTS_PATH = "/var/lib/apt/lists"
+PACKAGE_INDEX_CACHE_PATH = "/var/cache/apt/charm-packages-index.json"
+DPKG_ARCH_PATH = "/var/lib/dpkg/arch"
+APT_UPDATE_STAMP_PATH = "/var/cache/apt/charm-update-stamp.json"
+APT_SOURCES_LIST_PATH = "/etc/apt/sources.list"
+APT_SOURCES_PARTS_PATH = "/etc/apt/sources.list.d"
+APT_KEYRINGS_PATTERNS = (
+    "/etc/apt/trusted.gpg",
+    "/etc/apt/trusted.gpg.d/*",
+    "/etc/apt/keyrings/*",
+    "/usr/share/keyrings/*",
+)
+
+# `platform.machine()` values, and the matching Debian architecture names
+DEBIAN_ARCHITECTURES = {
+    "x86_64": "amd64",
+    "amd64": "amd64",
+    "aarch64": "arm64",
+    "arm64": "arm64",
+    "armv7l": "armhf",
+    "armv8l": "armhf",
+    "i386": "i386",
+    "i686": "i386",
+    "ppc64le": "ppc64el",
+    "s390x": "s390x",
+    "riscv64": "riscv64",
+}
+PACKAGE_FIELD_MATCHER = re.compile(rb"^Package:[ \t]*(\S+)", re.MULTILINE)
 
 
 class Error(Exception):
@@ -157,6 +204,10 @@ class PackageNotFoundError(Error):
     """Raised when a requested package is not known to the system."""
 
 
+class InvalidVersionConstraintError(Error):
+    """Raised when a version constraint cannot be parsed."""
+
+
 class PackageState(Enum):
     """A class to represent possible package states."""
 
@@ -166,6 +217,299 @@ class PackageState(Enum):
     Available = "available"
 
 
+class _ControlFile:
+    """A file of Debian control stanzas, such as the dpkg status database, indexed by package.
+
+    The file is mapped in memory and the offset of every stanza is indexed by package name on
+    first lookup. Only the stanzas of the requested packages are then parsed.
+
+    The identity of the file (inode, mtime and size) is recorded when it is opened, so that a
+    cached instance can be checked with `changed` and dropped once the file is rewritten.
+    """
+
+    def __init__(self, path: str, index: Optional[Dict] = None):
+        self.path = path
+        self.key = self._stat_key(path)
+        self._index: Optional[Dict[str, List[int]]] = None
+        if index and tuple(index.get("key", ())) == self.key:
+            self._index = index["index"]
+
+        with open(path, "rb") as f:
+            if self.key[2]:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b""
+
+    @staticmethod
+    def _stat_key(path: str) -> Tuple[int, int, int]:
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def changed(self) -> bool:
+        """Returns whether the file was modified, replaced or removed since it was opened."""
+        try:
+            return self._stat_key(self.path) != self.key
+        except OSError:
+            return True
+
+    @property
+    def indexed(self) -> bool:
+        """Returns whether the stanzas are indexed, or will be on the next lookup."""
+        return self._index is not None
+
+    @property
+    def index(self) -> Dict[str, List[int]]:
+        """Returns the offsets of the stanzas in the file, by package name."""
+        if self._index is None:
+            index = {}
+            for match in PACKAGE_FIELD_MATCHER.finditer(self._data):
+                index.setdefault(match.group(1).decode(), []).append(match.start())
+            self._index = index
+        return self._index
+
+    @staticmethod
+    def _parse_stanza(stanza: str) -> Dict[str, str]:
+        """Parse the single-line fields of a stanza. Continuation lines are skipped."""
+        fields = {}
+        for line in stanza.splitlines():
+            if line and not line[0].isspace():
+                key, _, value = line.partition(":")
+                fields[key] = value.strip()
+        return fields
+
+    def get(self, package: str) -> Iterator[Dict[str, str]]:
+        """Yields the fields of every stanza for a package."""
+        for start in self.index.get(package, []):
+            end = self._data.find(b"\n\n", start)
+            if end == -1:
+                end = len(self._data)
+            yield self._parse_stanza(self._data[start:end].decode("utf-8", "replace"))
+
+
+# characters percent-encoded by apt in the names of the lists it downloads
+_LISTS_QUOTED_CHARS = set('\\|{}[]<>"^~_=!@#$%^&*')
+
+
+def _lists_prefix(uri: str, path: str) -> str:
+    """Returns the prefix of the names apt gives the lists downloaded from a path of a URI.
+
+    Like apt's `URItoFileName`, the scheme and credentials are dropped, reserved characters are
+    percent-encoded, and slashes are replaced by underscores.
+    """
+    parsed = urlparse(uri)
+    location = "{}{}/{}".format(parsed.netloc.rpartition("@")[2], parsed.path.rstrip("/"), path)
+    quoted = "".join(
+        "%{:02x}".format(ord(c)) if c in _LISTS_QUOTED_CHARS or not " " < c < "\x7f" else c
+        for c in location
+    )
+    return quoted.replace("/", "_")
+
+
+def _enabled_lists_prefixes(sources: Iterable[str]) -> Tuple[str, ...]:
+    """Returns the prefixes of the package lists of the repositories enabled in sources files."""
+    prefixes = set()
+    for source in sources:
+        try:
+            repos_args, _ = RepositoryMapping._cached_repository_args(source)
+        except OSError:
+            continue
+        for enabled, repotype, uri, release, groups, _, _, _ in repos_args:
+            if not enabled or repotype != "deb":
+                continue
+            if release.endswith("/"):
+                # flat repository, with its lists at the given path
+                prefixes.add(_lists_prefix(uri, release.lstrip("./")))
+            for group in groups:
+                prefixes.add(_lists_prefix(uri, "dists/{}/{}/".format(release, group)))
+    return tuple(sorted(prefixes))
+
+
+class _PackageLists:
+    """The package indices downloaded by `apt-get update`, indexed by package name.
+
+    Each `*_Packages` file in `APT_LISTS_PATH` which belongs to a repository enabled in the
+    sources is a `_ControlFile`. Lists left behind by removed or disabled repositories are
+    skipped, as apt does. The offsets of the stanzas are stored in `PACKAGE_INDEX_CACHE_PATH`,
+    along with the identity of the file they were read from, so that a list is only scanned
+    again once `apt-get update` rewrote it.
+    """
+
+    def __init__(
+        self, lists_dir: str = APT_LISTS_PATH, cache_path: str = PACKAGE_INDEX_CACHE_PATH
+    ):
+        self.lists_dir = lists_dir
+        self.cache_path = cache_path
+        self._sources = _snapshot_files(_sources_patterns())
+        self._all_paths = self._glob_lists()
+        prefixes = _enabled_lists_prefixes(self._sources)
+        self.paths = [p for p in self._all_paths if os.path.basename(p).startswith(prefixes)]
+        if len(self.paths) < len(self._all_paths):
+            logger.debug(
+                "skipping %d package lists of no enabled repository",
+                len(self._all_paths) - len(self.paths),
+            )
+
+        cached = self._load_cache()
+        self._files = [_ControlFile(path, cached.get(path)) for path in self.paths]
+        self._dirty = not all(f.indexed for f in self._files)
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self) -> None:
+        """Write the stanza offsets of every list, replacing the cache file atomically."""
+        cache = {f.path: {"key": f.key, "index": f.index} for f in self._files}
+        tmp_path = "{}.{}".format(self.cache_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(cache, f, separators=(",", ":"))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.debug("could not write the package index cache: %s", e)
+
+    def _glob_lists(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.lists_dir, "*_Packages")))
+
+    def changed(self) -> bool:
+        """Returns whether a list or a sources file was added, removed or rewritten since."""
+        return (
+            self._glob_lists() != self._all_paths
+            or _snapshot_files(_sources_patterns()) != self._sources
+            or any(f.changed() for f in self._files)
+        )
+
+    def get(self, package: str) -> Iterator[Dict[str, str]]:
+        """Yields the fields of every stanza for a package, across all lists."""
+        stanzas = [stanza for f in self._files for stanza in f.get(package)]
+        if self._dirty:
+            self._save_cache()
+            self._dirty = False
+        return iter(stanzas)
+
+
+_dpkg_status: Optional[_ControlFile] = None
+_package_lists: Optional[_PackageLists] = None
+
+
+def _get_dpkg_status() -> Optional[_ControlFile]:
+    """Returns the dpkg status database, reopened only if the file changed.
+
+    Returns None if the database cannot be read, e.g. on a system without dpkg.
+    """
+    global _dpkg_status
+    if _dpkg_status is None or _dpkg_status.changed():
+        try:
+            _dpkg_status = _ControlFile(DPKG_STATUS_PATH)
+        except OSError as e:
+            logger.debug("could not read the dpkg status database: %s", e)
+            _dpkg_status = None
+    return _dpkg_status
+
+
+def _get_package_lists() -> Optional[_PackageLists]:
+    """Returns the indexed apt package lists, reopened only if they changed.
+
+    Returns None if there are no uncompressed lists of enabled repositories to read, e.g. if apt
+    is configured to keep them compressed.
+    """
+    global _package_lists
+    if _package_lists is None or _package_lists.changed():
+        try:
+            _package_lists = _PackageLists(APT_LISTS_PATH, PACKAGE_INDEX_CACHE_PATH)
+        except OSError as e:
+            logger.debug("could not read the apt package lists: %s", e)
+            _package_lists = None
+        if _package_lists is not None and not _package_lists.paths:
+            _package_lists = None
+    return _package_lists
+
+
+_system_architecture: Optional[str] = None
+_foreign_architectures: Optional[Tuple[Optional[int], List[str]]] = None
+
+
+def get_system_architecture() -> str:
+    """Returns the native Debian architecture of the system, e.g. `amd64`.
+
+    The architecture is detected once per process: from the `dpkg` package in the dpkg status
+    database, which is always native, then from `platform.machine()`, and only then by forking
+    `dpkg --print-architecture`.
+    """
+    global _system_architecture
+    if _system_architecture:
+        return _system_architecture
+
+    status = _get_dpkg_status()
+    dpkg = next(status.get("dpkg"), {}) if status is not None else {}
+    arch = dpkg.get("Architecture") or DEBIAN_ARCHITECTURES.get(platform.machine())
+    if not arch:
+        arch = check_output(["dpkg", "--print-architecture"], universal_newlines=True).strip()
+
+    _system_architecture = arch
+    return arch
+
+
+def get_foreign_architectures() -> List[str]:
+    """Returns the foreign architectures enabled with `dpkg --add-architecture`.
+
+    The architectures are read from the dpkg database, and read again only when it changes.
+    `dpkg --print-foreign-architectures` is only used if the database cannot be read.
+    """
+    global _foreign_architectures
+    try:
+        mtime = os.stat(DPKG_ARCH_PATH).st_mtime_ns
+    except FileNotFoundError:
+        # dpkg only writes the file once a foreign architecture has been added
+        mtime = 0
+    except OSError:
+        mtime = None
+
+    if _foreign_architectures is None or mtime is None or _foreign_architectures[0] != mtime:
+        if mtime == 0:
+            archs = []
+        elif mtime is not None:
+            with open(DPKG_ARCH_PATH, "r") as f:
+                archs = f.read().split()
+        else:
+            archs = check_output(
+                ["dpkg", "--print-foreign-architectures"], universal_newlines=True
+            ).split()
+        native = get_system_architecture()
+        _foreign_architectures = mtime, [arch for arch in archs if arch != native]
+
+    return list(_foreign_architectures[1])
+
+
+def _select_architecture(package: str, arch: Optional[str]) -> Tuple[str, str]:
+    """Splits a `name:arch` qualifier off a package name, and checks the architecture is enabled.
+
+    Args:
+        package: a string representing the package, optionally qualified as `name:arch`
+        arch: an optional architecture, used if the package is not qualified
+
+    Returns: a tuple of the package name and the architecture to select, defaulting to
+        `get_system_architecture()`
+
+    Raises:
+        PackageNotFoundError if the architecture is neither native nor a foreign architecture
+            enabled with `dpkg --add-architecture`
+    """
+    package, _, qualifier = package.partition(":")
+    arch = qualifier or arch or get_system_architecture()
+    if arch not in ("all", get_system_architecture()) and arch not in get_foreign_architectures():
+        raise PackageNotFoundError(
+            "Package {}.{} cannot be found: architecture {} is not enabled".format(
+                package, arch, arch
+            )
+        )
+    return package, arch
+
+
 class DebianPackage:
     """Represents a traditional Debian package and its utility functions.
 
@@ -355,8 +699,9 @@ class DebianPackage:
 
         Args:
             package: a string representing the package
-            version: an optional string if a specific version isr equested
-            arch: an optional architecture, defaulting to `dpkg --print-architecture`. If an
+            version: an optional string if a specific version isr equested, or a
+                `VersionConstraint` expression such as ">= 2.8, << 3.0"
+            arch: an optional architecture, defaulting to `get_system_architecture()`. If an
                 architecture is not specified, this will be used for selection.
 
         """
@@ -386,16 +731,21 @@ class DebianPackage:
     ) -> "DebianPackage":
         """Check whether the package is already installed and return an instance.
 
+        The dpkg status database is read directly, and cached until it changes. `dpkg -l` is
+        only used if the database cannot be read.
+
         Args:
-            package: a string representing the package
+            package: a string representing the package, optionally qualified as `name:arch`
             version: an optional string if a specific version isr equested
-            arch: an optional architecture, defaulting to `dpkg --print-architecture`.
-                If an architecture is not specified, this will be used for selection.
+            arch: an optional architecture, defaulting to `get_system_architecture()`.
+                If an architecture is not specified, this will be used for selection. Foreign
+                architectures must be enabled, see `get_foreign_architectures()`.
         """
-        system_arch = check_output(
-            ["dpkg", "--print-architecture"], universal_newlines=True
-        ).strip()
-        arch = arch if arch else system_arch
+        package, arch = _select_architecture(package, arch)
+
+        status = _get_dpkg_status()
+        if status is not None:
+            return cls._from_dpkg_status(status, package, version, arch)
 
         # Regexps are a really terrible way to do this. Thanks dpkg
         output = ""
@@ -441,7 +791,7 @@ class DebianPackage:
                     PackageState.Present,
                 )
                 if (pkg.arch == "all" or pkg.arch == arch) and (
-                    version == "" or str(pkg.version) == version
+                    _version_matches(pkg.version, version)
                 ):
                     return pkg
             except AttributeError:
@@ -450,22 +800,65 @@ class DebianPackage:
         # If we didn't find it, fail through
         raise PackageNotFoundError("Package {}.{} is not installed!".format(package, arch))
 
+    @classmethod
+    def _from_dpkg_status(
+        cls, status: _ControlFile, package: str, version: str, arch: str
+    ) -> "DebianPackage":
+        """Find an installed package in the dpkg status database, without forking `dpkg`.
+
+        Args:
+            status: the dpkg status database
+            package: a string representing the package
+            version: an optional string if a specific version is requested
+            arch: the architecture to select
+        """
+        for fields in status.get(package):
+            package_status = fields.get("Status", "").split()
+            if package_status[-1:] != ["installed"]:
+                logger.debug(
+                    "package '%s' in dpkg status but not installed, status: '%s'",
+                    package,
+                    fields.get("Status", ""),
+                )
+                continue
+
+            epoch, split_version = DebianPackage._get_epoch_from_version(fields["Version"])
+            pkg = DebianPackage(
+                fields["Package"],
+                split_version,
+                epoch,
+                fields.get("Architecture", ""),
+                PackageState.Present,
+            )
+            if (pkg.arch == "all" or pkg.arch == arch) and (
+                _version_matches(pkg.version, version)
+            ):
+                return pkg
+
+        raise PackageNotFoundError("Package {}.{} is not installed!".format(package, arch))
+
     @classmethod
     def from_apt_cache(
         cls, package: str, version: Optional[str] = "", arch: Optional[str] = ""
     ) -> "DebianPackage":
-        """Check whether the package is already installed and return an instance.
+        """Check whether the package is known to apt and return an instance.
+
+        The package lists downloaded by `apt-get update` are read directly, through an index
+        cached on disk until they change. `apt-cache show` is only used if there are no lists
+        to read.
 
         Args:
-            package: a string representing the package
+            package: a string representing the package, optionally qualified as `name:arch`
             version: an optional string if a specific version isr equested
-            arch: an optional architecture, defaulting to `dpkg --print-architecture`.
-                If an architecture is not specified, this will be used for selection.
+            arch: an optional architecture, defaulting to `get_system_architecture()`.
+                If an architecture is not specified, this will be used for selection. Foreign
+                architectures must be enabled, see `get_foreign_architectures()`.
         """
-        system_arch = check_output(
-            ["dpkg", "--print-architecture"], universal_newlines=True
-        ).strip()
-        arch = arch if arch else system_arch
+        package, arch = _select_architecture(package, arch)
+
+        lists = _get_package_lists()
+        if lists is not None:
+            return cls._from_package_lists(lists, package, version, arch)
 
         # Regexps are a really terrible way to do this. Thanks dpkg
         keys = ("Package", "Architecture", "Version")
@@ -502,13 +895,80 @@ class DebianPackage:
             )
 
             if (pkg.arch == "all" or pkg.arch == arch) and (
-                version == "" or str(pkg.version) == version
+                _version_matches(pkg.version, version)
             ):
                 return pkg
 
         # If we didn't find it, fail through
         raise PackageNotFoundError("Package {}.{} is not in the apt cache!".format(package, arch))
 
+    @classmethod
+    def _from_package_lists(
+        cls, lists: _PackageLists, package: str, version: str, arch: str
+    ) -> "DebianPackage":
+        """Find the most recent candidate for a package in the apt lists, without `apt-cache`.
+
+        Args:
+            lists: the indexed apt package lists
+            package: a string representing the package
+            version: an optional string if a specific version is requested
+            arch: the architecture to select
+        """
+        candidates = []
+        for fields in lists.get(package):
+            epoch, split_version = DebianPackage._get_epoch_from_version(fields["Version"])
+            pkg = DebianPackage(
+                fields["Package"],
+                split_version,
+                epoch,
+                fields.get("Architecture", ""),
+                PackageState.Available,
+            )
+            if (pkg.arch == "all" or pkg.arch == arch) and (
+                _version_matches(pkg.version, version)
+            ):
+                candidates.append(pkg)
+
+        if not candidates:
+            raise PackageNotFoundError(
+                "Package {}.{} is not in the apt cache!".format(package, arch)
+            )
+        return max(candidates, key=lambda pkg: pkg.version.sort_key())
+
+
+REVISION_PARTS_MATCHER = re.compile(r"([^0-9]*)([0-9]*)")
+
+
+def _char_order(char: str) -> int:
+    """The sort order of a character in a Debian version, as in `dpkg`.
+
+    A tilde sorts before anything, even the end of a part (weighted 0), and letters sort
+    before all the non-letters.
+    """
+    if char == "~":
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+@functools.lru_cache(maxsize=65536)
+def _revision_key(revision: str) -> Tuple:
+    """Returns a key which sorts like an upstream or Debian revision string.
+
+    The revision is split into alternating non-digit and digit parts. Each non-digit part is
+    turned into the sort order of its characters, followed by the weight of the end of a part,
+    and each digit part into an integer. A final empty part stands for the end of the revision,
+    so that a tilde after the end of the other revision still sorts first.
+    """
+    key = []
+    for i, (alphas, digits) in enumerate(REVISION_PARTS_MATCHER.findall(revision)):
+        # always keep the first part, so that "" and "0" are equal
+        if alphas or digits or i == 0:
+            key.append((tuple(_char_order(char) for char in alphas) + (0,), int(digits or 0)))
+    key.append(((0,), 0))
+    return tuple(key)
+
 
 class Version:
     """An abstraction around package versions.
@@ -523,6 +983,7 @@ class Version:
     def __init__(self, version: str, epoch: str):
         self._version = version
         self._epoch = epoch or ""
+        self._key: Optional[Tuple[int, Tuple, Tuple]] = None
 
     def __repr__(self):
         """A representation of the package."""
@@ -553,148 +1014,28 @@ class Version:
         upstream, debian = version.rsplit("-", 1)
         return upstream, debian
 
-    def _listify(self, revision: str) -> List[str]:
-        """Split a revision string into a listself.
+    def sort_key(self) -> Tuple[int, Tuple, Tuple]:
+        """Returns a key which sorts like the version, e.g. for `sorted` or `max`.
 
-        This list is comprised of  alternating between strings and numbers,
-        padded on either end to always be "str, int, str, int..." and
-        always be of even length.  This allows us to trivially implement the
-        comparison algorithm described.
+        The key is computed once per instance, and the keys of the upstream and Debian revisions
+        are cached across instances, so repeated comparisons do not parse the version again.
         """
-        result = []
-        while revision:
-            rev_1, remains = self._get_alphas(revision)
-            rev_2, remains = self._get_digits(remains)
-            result.extend([rev_1, rev_2])
-            revision = remains
-        return result
-
-    def _get_alphas(self, revision: str) -> Tuple[str, str]:
-        """Return a tuple of the first non-digit characters of a revision."""
-        # get the index of the first digit
-        for i, char in enumerate(revision):
-            if char.isdigit():
-                if i == 0:
-                    return "", revision
-                return revision[0:i], revision[i:]
-        # string is entirely alphas
-        return revision, ""
-
-    def _get_digits(self, revision: str) -> Tuple[int, str]:
-        """Return a tuple of the first integer characters of a revision."""
-        # If the string is empty, return (0,'')
-        if not revision:
-            return 0, ""
-        # get the index of the first non-digit
-        for i, char in enumerate(revision):
-            if not char.isdigit():
-                if i == 0:
-                    return 0, revision
-                return int(revision[0:i]), revision[i:]
-        # string is entirely digits
-        return int(revision), ""
-
-    def _dstringcmp(self, a, b):  # noqa: C901
-        """Debian package version string section lexical sort algorithm.
-
-        The lexical comparison is a comparison of ASCII values modified so
-        that all the letters sort earlier than all the non-letters and so that
-        a tilde sorts before anything, even the end of a part.
-        """
-        if a == b:
-            return 0
-        try:
-            for i, char in enumerate(a):
-                if char == b[i]:
-                    continue
-                # "a tilde sorts before anything, even the end of a part"
-                # (emptyness)
-                if char == "~":
-                    return -1
-                if b[i] == "~":
-                    return 1
-                # "all the letters sort earlier than all the non-letters"
-                if char.isalpha() and not b[i].isalpha():
-                    return -1
-                if not char.isalpha() and b[i].isalpha():
-                    return 1
-                # otherwise lexical sort
-                if ord(char) > ord(b[i]):
-                    return 1
-                if ord(char) < ord(b[i]):
-                    return -1
-        except IndexError:
-            # a is longer than b but otherwise equal, greater unless there are tildes
-            if char == "~":
-                return -1
-            return 1
-        # if we get here, a is shorter than b but otherwise equal, so check for tildes...
-        if b[len(a)] == "~":
-            return 1
-        return -1
-
-    def _compare_revision_strings(self, first: str, second: str):  # noqa: C901
-        """Compare two debian revision strings."""
-        if first == second:
-            return 0
-
-        # listify pads results so that we will always be comparing ints to ints
-        # and strings to strings (at least until we fall off the end of a list)
-        first_list = self._listify(first)
-        second_list = self._listify(second)
-        if first_list == second_list:
-            return 0
-        try:
-            for i, item in enumerate(first_list):
-                # explicitly raise IndexError if we've fallen off the edge of list2
-                if i >= len(second_list):
-                    raise IndexError
-                # if the items are equal, next
-                if item == second_list[i]:
-                    continue
-                # numeric comparison
-                if isinstance(item, int):
-                    if item > second_list[i]:
-                        return 1
-                    if item < second_list[i]:
-                        return -1
-                else:
-                    # string comparison
-                    return self._dstringcmp(item, second_list[i])
-        except IndexError:
-            # rev1 is longer than rev2 but otherwise equal, hence greater
-            # ...except for goddamn tildes
-            if first_list[len(second_list)][0][0] == "~":
-                return 1
-            return 1
-        # rev1 is shorter than rev2 but otherwise equal, hence lesser
-        # ...except for goddamn tildes
-        if second_list[len(first_list)][0][0] == "~":
-            return -1
-        return -1
+        if self._key is None:
+            upstream_version, debian_version = self._get_parts(self._version)
+            self._key = (
+                int(self._epoch or 0),
+                _revision_key(upstream_version),
+                _revision_key(debian_version),
+            )
+        return self._key
 
     def _compare_version(self, other) -> int:
-        if (self.number, self.epoch) == (other.number, other.epoch):
-            return 0
-
-        if self.epoch < other.epoch:
-            return -1
-        if self.epoch > other.epoch:
-            return 1
+        key, other_key = self.sort_key(), other.sort_key()
+        return (key > other_key) - (key < other_key)
 
-        # If none of these are true, follow the algorithm
-        upstream_version, debian_version = self._get_parts(self.number)
-        other_upstream_version, other_debian_version = self._get_parts(other.number)
-
-        upstream_cmp = self._compare_revision_strings(upstream_version, other_upstream_version)
-        if upstream_cmp != 0:
-            return upstream_cmp
-
-        debian_cmp = self._compare_revision_strings(debian_version, other_debian_version)
-        if debian_cmp != 0:
-            return debian_cmp
-
-        return 0
+    def __hash__(self):
+        """A hash consistent with equality, so equal versions are the same dict key."""
+        return hash(self.sort_key())
 
     def __lt__(self, other) -> bool:
         """Less than magic method impl."""
@@ -721,6 +1062,115 @@ class Version:
         return not self.__eq__(other)
 
 
+class VersionConstraint:
+    """A constraint on the version of a package, e.g. `>= 2.8, << 3.0`.
+
+    A constraint is a comma-separated list of relations, which a version must all satisfy. The
+    relations are those of Debian package relationships (`<<`, `<=`, `=`, `>=` and `>>`), and
+    `~=` for a compatible release: `~= 2.8.1` is the same as `>= 2.8.1, << 2.9~`.
+
+    Versions are compared through their `Version.sort_key`, so selecting the best of many
+    candidates does not parse any of them twice.
+    """
+
+    RELATIONS = {
+        "<<": operator.lt,
+        "<=": operator.le,
+        "=": operator.eq,
+        ">=": operator.ge,
+        ">>": operator.gt,
+    }
+    RELATION_MATCHER = re.compile(r"^\(?\s*(<<|<=|=|>=|>>|~=)\s*([^\s)]+)\s*\)?$")
+
+    def __init__(self, constraint: str):
+        self._constraint = constraint
+        self._relations: List[Tuple[str, Tuple]] = []
+
+        for clause in constraint.split(","):
+            match = self.RELATION_MATCHER.match(clause.strip())
+            if not match:
+                raise InvalidVersionConstraintError(
+                    "Invalid version constraint '{}' in '{}'".format(clause.strip(), constraint)
+                )
+            relation, version = match.groups()
+            if relation == "~=":
+                self._relations.append((">=", self._sort_key(version)))
+                self._relations.append(("<<", self._sort_key(self._next_release(version))))
+            else:
+                self._relations.append((relation, self._sort_key(version)))
+
+    def __repr__(self):
+        """A representation of the constraint."""
+        return "<{}.{}: {}>".format(self.__module__, self.__class__.__name__, self._constraint)
+
+    def __str__(self):
+        """The constraint, as it was given."""
+        return self._constraint
+
+    @staticmethod
+    def is_constraint(version: str) -> bool:
+        """Returns whether a version string is a constraint rather than an exact version."""
+        return version.lstrip()[:1] in ("<", ">", "=", "~", "(")
+
+    @staticmethod
+    def _sort_key(version: str) -> Tuple:
+        epoch, number = DebianPackage._get_epoch_from_version(version)
+        return Version(number, epoch).sort_key()
+
+    @staticmethod
+    def _next_release(version: str) -> str:
+        """Returns the lowest version above the compatible releases of a version.
+
+        The last component of the upstream version is dropped, and the one before incremented:
+        `2.8.1` gives `2.9~`, `2.8` gives `3~`, and `1:2` gives `1:3~`.
+        """
+        epoch, number = DebianPackage._get_epoch_from_version(version)
+        components = number.split("-", 1)[0].split(".")
+        if len(components) > 1:
+            components.pop()
+
+        match = re.match(r"^(\d+)(.*)$", components[-1])
+        if not match:
+            raise InvalidVersionConstraintError(
+                "Cannot find the compatible releases of version '{}'".format(version)
+            )
+        components[-1] = str(int(match.group(1)) + 1)
+        return "{}{}~".format("{}:".format(epoch) if epoch else "", ".".join(components))
+
+    def matches(self, version: "Version") -> bool:
+        """Returns whether a version satisfies every relation of the constraint."""
+        key = version.sort_key()
+        return all(self.RELATIONS[relation](key, bound) for relation, bound in self._relations)
+
+    def select(self, versions: Iterable["Version"]) -> Optional["Version"]:
+        """Returns the highest of the versions which satisfy the constraint, if any."""
+        return max(
+            (version for version in versions if self.matches(version)),
+            key=Version.sort_key,
+            default=None,
+        )
+
+
+def _version_matches(version: Version, requested: str) -> bool:
+    """Returns whether a version is the requested version, or satisfies a constraint.
+
+    Args:
+        version: the version of a package
+        requested: an exact version, a `VersionConstraint` expression, or "" for any version
+    """
+    if not requested:
+        return True
+    if VersionConstraint.is_constraint(requested):
+        return _get_version_constraint(requested).matches(version)
+    return str(version) == requested
+
+
+@functools.lru_cache(maxsize=128)
+def _get_version_constraint(constraint: str) -> VersionConstraint:
+    """Returns the parsed constraint, so that it is parsed once for all candidates."""
+    return VersionConstraint(constraint)
+
+
 def add_package(
     package_names: Union[str, List[str]],
     version: Optional[str] = "",
@@ -729,22 +1179,24 @@ def add_package(
 ) -> Union[DebianPackage, List[DebianPackage]]:
     """Add a package or list of packages to the system.
 
+    The packages which are not installed yet are installed with a single `apt-get install`.
+    Packages which cannot be found are retried once after updating the apt cache.
+
     Args:
         name: the name(s) of the package(s)
-        version: an (Optional) version as a string. Defaults to the latest known
+        version: an (Optional) version, or a `VersionConstraint` such as ">= 2.8, << 3.0", as a
+            string. Defaults to the latest known
         arch: an optional architecture for the package
         update_cache: whether or not to run `apt-get update` prior to operating
 
     Raises:
-        PackageNotFoundError if the package is not in the cache.
+        PackageError listing every package which could not be found or installed.
     """
     cache_refreshed = False
     if update_cache:
         update()
         cache_refreshed = True
 
-    packages = {"success": [], "retry": [], "failed": []}
-
     package_names = [package_names] if type(package_names) is str else package_names
     if not package_names:
         raise TypeError("Expected at least one package name to add, received zero!")
@@ -754,29 +1206,75 @@ def add_package(
             "Explicit version should not be set if more than one package is being added!"
         )
 
-    for p in package_names:
-        pkg, success = _add(p, version, arch)
-        if success:
-            packages["success"].append(pkg)
-        else:
-            logger.warning("failed to locate and install/update '%s'", pkg)
-            packages["retry"].append(p)
+    success, retry, failed = _add_many(package_names, version, arch)
+    for p in retry:
+        logger.warning("failed to locate and install/update '%s'", p)
 
-    if packages["retry"] and not cache_refreshed:
+    if retry and not cache_refreshed:
         logger.info("updating the apt-cache and retrying installation of failed packages.")
         update()
 
-        for p in packages["retry"]:
-            pkg, success = _add(p, version, arch)
-            if success:
-                packages["success"].append(pkg)
-            else:
-                packages["failed"].append(p)
+        retried, retry, retry_failed = _add_many(retry, version, arch)
+        success.extend(retried)
+        failed.update(retry_failed)
+
+    failures = ["{} (not found)".format(p) for p in retry]
+    failures.extend("{} ({})".format(p, reason) for p, reason in failed.items())
+    if failures:
+        raise PackageError("Failed to install packages: {}".format(", ".join(failures)))
+
+    return success if len(success) > 1 else success[0]
+
+
+def _add_many(
+    package_names: List[str],
+    version: Optional[str] = "",
+    arch: Optional[str] = "",
+) -> Tuple[List[DebianPackage], List[str], Dict[str, str]]:
+    """Adds packages, installing all those missing in a single `apt-get install` transaction.
+
+    If the transaction fails, the packages are installed one at a time, so that the packages
+    which cannot be installed are reported separately.
+
+    Args:
+        package_names: the names of the packages
+        version: an (Optional) version as a string. Defaults to the latest known
+        arch: an optional architecture for the packages
 
-    if packages["failed"]:
-        raise PackageError("Failed to install packages: {}".format(", ".join(packages["failed"])))
+    Returns: a tuple of the `DebianPackage`s installed or already present, the names of the
+        packages which could not be found, and the reason each failed package was not installed
+    """
+    found, not_found = [], []
+    for name in package_names:
+        try:
+            found.append(DebianPackage.from_system(name, version, arch))
+        except PackageNotFoundError:
+            not_found.append(name)
 
-    return packages["success"] if len(packages["success"]) > 1 else packages["success"][0]
+    pending = [pkg for pkg in found if not pkg.present]
+    failed = {}
+    if len(pending) > 1:
+        try:
+            DebianPackage._apt(
+                "install",
+                ["{}={}".format(pkg.name, pkg.version) for pkg in pending],
+                optargs=["--option=Dpkg::Options::=--force-confold"],
+            )
+            pending = []
+        except PackageError as e:
+            logger.warning("could not install packages together, retrying one by one: %s", e)
+
+    for pkg in pending:
+        try:
+            pkg._add()
+        except PackageError as e:
+            failed[pkg.name] = e.message
+
+    for pkg in found:
+        if pkg.name not in failed:
+            pkg._state = PackageState.Present
+
+    return [pkg for pkg in found if pkg.name not in failed], not_found, failed
 
 
 def _add(
@@ -832,9 +1330,154 @@ def remove_package(
     return packages[0] if len(packages) == 1 else packages
 
 
-def update() -> None:
-    """Updates the apt cache via `apt-get update`."""
-    check_call(["apt-get", "update"], stderr=PIPE, stdout=PIPE)
+def _snapshot_files(patterns: Iterable[str]) -> Dict[str, int]:
+    """Returns the mtime of every file matching the glob patterns, by path."""
+    files = {}
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            try:
+                files[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+    return files
+
+
+def _sources_patterns() -> Tuple[str, ...]:
+    """Returns the glob patterns of the sources files read by apt and `RepositoryMapping`."""
+    return (
+        APT_SOURCES_LIST_PATH,
+        os.path.join(APT_SOURCES_PARTS_PATH, "*.list"),
+        os.path.join(APT_SOURCES_PARTS_PATH, "*.sources"),
+    )
+
+
+def _enabled_entries(path: str) -> List[str]:
+    """Returns the enabled entries of a sources file, one per type, URI, suite and component."""
+    try:
+        repos_args, _ = RepositoryMapping._cached_repository_args(path)
+    except OSError:
+        return []
+
+    entries = []
+    for enabled, repotype, uri, release, groups, _, _, options in repos_args:
+        if not enabled:
+            continue
+        options_string = ",".join("{}={}".format(k, v) for k, v in sorted(options))
+        for group in groups or ("",):
+            entries.append(" ".join([repotype, options_string, uri, release, group]))
+    return sorted(entries)
+
+
+def _load_update_stamp() -> Dict:
+    try:
+        with open(APT_UPDATE_STAMP_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_update_stamp(stamp: Dict) -> None:
+    tmp_path = "{}.{}".format(APT_UPDATE_STAMP_PATH, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(APT_UPDATE_STAMP_PATH), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(stamp, f)
+        os.replace(tmp_path, APT_UPDATE_STAMP_PATH)
+    except OSError as e:
+        logger.debug("could not record the apt update: %s", e)
+
+
+def _outdated_sources(max_age: float) -> Optional[List[str]]:
+    """Returns the sources files to update for the apt cache to be fresh.
+
+    Returns None if the whole cache should be updated, because the last update made by `update`
+    is older than `max_age` seconds, a keyring changed since, or repositories were removed or
+    disabled since. Only a full update drops the package lists of such repositories. Otherwise,
+    returns the sources files added or changed since the last update, if any.
+    """
+    stamp = _load_update_stamp()
+    if "entries" not in stamp or time.time() - stamp["time"] > max_age:
+        logger.debug("apt cache is older than %ss", max_age)
+        return None
+    if _snapshot_files(APT_KEYRINGS_PATTERNS) != stamp["keyrings"]:
+        logger.debug("apt keyrings changed since the last update")
+        return None
+
+    recorded = stamp["sources"]
+    current = _snapshot_files(_sources_patterns())
+    removed = [path for path in recorded if path not in current]
+    if removed:
+        logger.debug("apt sources removed since the last update: %s", ", ".join(removed))
+        return None
+
+    changed = [path for path, mtime in current.items() if recorded.get(path) != mtime]
+    for path in changed:
+        if set(stamp["entries"].get(path, ())) - set(_enabled_entries(path)):
+            logger.debug("repositories removed from '%s' since the last update", path)
+            return None
+    return changed
+
+
+def update(max_age: Optional[float] = None, sources: Optional[List[str]] = None) -> bool:
+    """Updates the apt cache via `apt-get update`.
+
+    Every update made through this function is recorded, along with the state of the apt
+    sources and keyrings at the time. With `max_age`, a recent update is reused: the cache is
+    only updated in full if the last update is older than `max_age` seconds, or a keyring
+    changed or a repository was removed or disabled since. Otherwise, only the sources files
+    with repositories added since are updated, if any.
+
+    Args:
+        max_age: an (Optional) maximum age in seconds of the last update, to skip updating
+        sources: an (Optional) list of sources files to update, instead of every repository
+
+    Returns:
+        True if the apt cache was updated, fully or in part. False if it was fresh already.
+    """
+    if sources is None and max_age is not None:
+        sources = _outdated_sources(max_age)
+        if sources == []:
+            logger.debug("apt cache is up to date, skipping update")
+            return False
+
+    current_sources = _snapshot_files(_sources_patterns())
+    if sources is None:
+        check_call(["apt-get", "update"], stderr=PIPE, stdout=PIPE)
+        _save_update_stamp(
+            {
+                "time": time.time(),
+                "sources": current_sources,
+                "entries": {path: _enabled_entries(path) for path in current_sources},
+                "keyrings": _snapshot_files(APT_KEYRINGS_PATTERNS),
+            }
+        )
+        return True
+
+    for source in sources:
+        logger.debug("updating apt repositories from '%s'", source)
+        check_call(
+            [
+                "apt-get",
+                "-o",
+                "Dir::Etc::sourcelist={}".format(os.path.abspath(source)),
+                "-o",
+                "Dir::Etc::sourceparts=-",
+                "-o",
+                "APT::Get::List-Cleanup=0",
+                "update",
+            ],
+            stderr=PIPE,
+            stdout=PIPE,
+        )
+
+    stamp = _load_update_stamp()
+    if "entries" in stamp:
+        for source in sources:
+            if source in current_sources:
+                stamp["sources"][source] = current_sources[source]
+                stamp["entries"][source] = _enabled_entries(source)
+        _save_update_stamp(stamp)
+    return True
 
 
 class InvalidSourceError(Error):
@@ -845,6 +1488,115 @@ class GPGKeyError(Error):
     """Exceptions for GPG keys."""
 
 
+ARMOR_MATCHER = re.compile(
+    r"-----BEGIN PGP PUBLIC KEY BLOCK-----\r?\n(?P<body>.*?)-----END PGP PUBLIC KEY BLOCK-----",
+    re.DOTALL,
+)
+
+
+def _crc24(data: bytes) -> int:
+    """The CRC-24 checksum of ASCII armored OpenPGP data (RFC 4880, section 6.1)."""
+    crc = 0xB704CE
+    for byte in data:
+        crc ^= byte << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= 0x1864CFB
+    return crc & 0xFFFFFF
+
+
+def _dearmor(key_asc: bytes) -> bytes:
+    """Decode the first ASCII armored public key block in some key material.
+
+    Raises:
+        GPGKeyError if there is no valid public key block
+    """
+    match = ARMOR_MATCHER.search(key_asc.decode("utf-8", "replace"))
+    if not match:
+        raise GPGKeyError("ASCII armor markers missing from GPG key")
+
+    # Armor headers, if any, are separated from the data by an empty line
+    lines = [line.strip() for line in match.group("body").splitlines()]
+    if "" in lines:
+        lines = lines[lines.index("") + 1 :]
+
+    checksum = None
+    if lines and lines[-1].startswith("=") and len(lines[-1]) == 5:
+        checksum = lines.pop()[1:]
+
+    try:
+        data = base64.b64decode("".join(lines), validate=True)
+        if checksum is not None and _crc24(data).to_bytes(3, "big") != base64.b64decode(checksum):
+            raise GPGKeyError("Invalid GPG key material: armor checksum mismatch")
+    except binascii.Error as e:
+        raise GPGKeyError("Invalid GPG key material: {}".format(e)) from None
+
+    return data
+
+
+def _read_packet(data: bytes, offset: int) -> Tuple[int, bytes, int]:
+    """Read the OpenPGP packet at an offset (RFC 4880, section 4.2).
+
+    Returns:
+        a tuple of the packet tag, the packet body and the offset of the next packet
+
+    Raises:
+        GPGKeyError if the packet header is invalid
+    """
+    try:
+        header = data[offset]
+        if not header & 0x80:
+            raise GPGKeyError("Invalid GPG key material: bad packet header")
+
+        if header & 0x40:
+            # new format
+            tag = header & 0x3F
+            first = data[offset + 1]
+            if first < 192:
+                length, offset = first, offset + 2
+            elif first < 224:
+                length, offset = ((first - 192) << 8) + data[offset + 2] + 192, offset + 3
+            elif first == 255:
+                length, offset = int.from_bytes(data[offset + 2 : offset + 6], "big"), offset + 6
+            else:
+                raise GPGKeyError("Invalid GPG key material: partial length key packet")
+        else:
+            # old format
+            tag, length_type = (header >> 2) & 0x0F, header & 0x03
+            if length_type == 3:
+                length, offset = len(data) - offset - 1, offset + 1
+            else:
+                size = 1 << length_type
+                length = int.from_bytes(data[offset + 1 : offset + 1 + size], "big")
+                offset += 1 + size
+    except IndexError:
+        raise GPGKeyError("Invalid GPG key material: truncated packet") from None
+
+    if offset + length > len(data):
+        raise GPGKeyError("Invalid GPG key material: truncated packet")
+    return tag, data[offset : offset + length], offset + length
+
+
+def _fingerprint(key: bytes) -> str:
+    """Compute the fingerprint of the primary key of a binary OpenPGP public key.
+
+    Only v4 keys are supported: the fingerprint is the SHA-1 of the public key packet, prefixed
+    by 0x99 and its two-octet length (RFC 4880, section 12.2).
+
+    Raises:
+        GPGKeyError if the key is not a v4 public key
+    """
+    tag, body, _ = _read_packet(key, 0)
+    if tag != 6:
+        raise GPGKeyError("Invalid GPG key material: no public key packet")
+    if not body or body[0] != 4:
+        raise GPGKeyError("Unsupported GPG key version: {}".format(body[0] if body else None))
+
+    digest = hashlib.sha1(b"\x99" + len(body).to_bytes(2, "big") + body)
+    return digest.hexdigest().upper()
+
+
 class DebianRepository:
     """An abstraction to represent a repository."""
 
@@ -905,8 +1657,8 @@ class DebianRepository:
         Args:
             fname: a filename to write the repository information to.
         """
-        if not fname.endswith(".list"):
-            raise InvalidSourceError("apt source filenames should end in .list!")
+        if not fname.endswith((".list", ".sources")):
+            raise InvalidSourceError("apt source filenames should end in .list or .sources!")
 
         self._filename = fname
 
@@ -988,14 +1740,9 @@ class DebianRepository:
 
         Disable it instead of removing from the repository file.
         """
-        searcher = "{} {}{} {}".format(
-            self.repotype, self.make_options_string(), self.uri, self.release
-        )
-        for line in fileinput.input(self._filename, inplace=True):
-            if re.match(r"^{}\s".format(re.escape(searcher)), line):
-                print("# {}".format(line), end="")
-            else:
-                print(line, end="")
+        with open(self._filename, "r") as f:
+            content = f.read()
+        _write_file_atomic(self._filename, _disable_in_source(content, self))
 
     def import_key(self, key: str) -> None:
         """Import an ASCII Armor key.
@@ -1058,7 +1805,17 @@ class DebianRepository:
         Gets a GPG key fingerprint (40-digit, 160-bit) by the ASCII armor-encoded
         or binary GPG key material. Can be used, for example, to generate file
         names for keys passed via charm options.
+
+        The key is parsed in-process, and `gpg` is only used for keys which cannot be,
+        e.g. keys newer than OpenPGP v4.
         """
+        try:
+            if b"-----BEGIN PGP PUBLIC KEY BLOCK-----" in key_material:
+                return _fingerprint(_dearmor(key_material))
+            return _fingerprint(key_material)
+        except GPGKeyError as e:
+            logger.debug("could not read the GPG key fingerprint, falling back to gpg: %s", e)
+
         # Use the same gpg command for both Xenial and Bionic
         cmd = ["gpg", "--with-colons", "--with-fingerprint"]
         ps = subprocess.run(
@@ -1109,6 +1866,13 @@ class DebianRepository:
         keyserver_url = (
             "https://keyserver.ubuntu.com" "/pks/lookup?op=get&options=mr&exact=on&search=0x{}"
         )
+        # urllib uses the proxy server settings from the environment, as curl does
+        try:
+            with urllib.request.urlopen(keyserver_url.format(keyid), timeout=60) as response:
+                return response.read().decode()
+        except (urllib.error.URLError, OSError) as e:
+            logger.debug("could not fetch the GPG key, falling back to curl: %s", e)
+
         curl_cmd = ["curl", keyserver_url.format(keyid)]
         # use proxy server settings in order to retrieve the key
         return check_output(curl_cmd).decode()
@@ -1126,6 +1890,11 @@ class DebianRepository:
         Raises:
           GPGKeyError
         """
+        try:
+            return _dearmor(key_asc)
+        except GPGKeyError as e:
+            logger.debug("could not decode the GPG key, falling back to gpg: %s", e)
+
         ps = subprocess.run(["gpg", "--dearmor"], stdout=PIPE, stderr=PIPE, input=key_asc)
         out, err = ps.stdout, ps.stderr.decode()
         if "gpg: no valid OpenPGP data found." in err:
@@ -1149,6 +1918,149 @@ class DebianRepository:
             keyf.write(key_material)
 
 
+DEB822_OPTIONS = {
+    "Architectures": "arch",
+    "Languages": "lang",
+    "Targets": "target",
+    "PDiffs": "pdiffs",
+    "By-Hash": "by-hash",
+    "Allow-Insecure": "allow-insecure",
+    "Trusted": "trusted",
+}
+
+# parsed repositories by sources file, with the identity of the file they were parsed from
+_sources_cache: Dict[str, Tuple[Tuple[int, int, int], List[Tuple], List[int]]] = {}
+
+
+def _write_file_atomic(path: str, content: str) -> None:
+    """Replace the content of a file in one step, so that apt never reads it half-written."""
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+
+    tmp_path = os.path.join(os.path.dirname(path), ".{}.tmp".format(os.path.basename(path)))
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def _parse_deb822_stanza(stanza: str) -> Dict[str, str]:
+    """Parse the fields of a deb822 stanza, skipping comments."""
+    fields = {}
+    key = None
+    for line in stanza.splitlines():
+        if line.startswith("#"):
+            continue
+        if line[:1].isspace() and key:
+            fields[key] += "\n" + line.strip()
+        elif ":" in line:
+            key, _, value = line.partition(":")
+            key = key.strip()
+            fields[key] = value.strip()
+    return fields
+
+
+def _disable_in_source(content: str, repo: "DebianRepository") -> str:
+    """Returns the content of a sources file, with a repository disabled.
+
+    One-line style repositories are commented out. In a deb822 `.sources` file, the stanza of
+    the repository gets `Enabled: no`, so it must not define any other repository.
+
+    Raises:
+        InvalidSourceError if the deb822 stanza also defines other repositories
+    """
+    if not repo.filename.endswith(".sources"):
+        searcher = "{} {}{} {}".format(
+            repo.repotype, repo.make_options_string(), repo.uri, repo.release
+        )
+        matcher = re.compile(r"^{}\s".format(re.escape(searcher)))
+        return "".join(
+            "# {}".format(line) if matcher.match(line) else line
+            for line in content.splitlines(keepends=True)
+        )
+
+    stanzas = re.split(r"(\n[ \t]*\n)", content)
+    for i, stanza in enumerate(stanzas):
+        fields = _parse_deb822_stanza(stanza)
+        repos = RepositoryMapping._parse_deb822_fields(fields, repo.filename)
+        keys = [(r.repotype, r.uri, r.release) for r in repos]
+        if (repo.repotype, repo.uri, repo.release) not in keys:
+            continue
+        if len(keys) > 1:
+            raise InvalidSourceError(
+                "Cannot disable {} {} {} alone, other repositories share its stanza in {}".format(
+                    repo.repotype, repo.uri, repo.release, repo.filename
+                )
+            )
+        if "Enabled" in fields:
+            stanzas[i] = re.sub(r"(?mi)^Enabled:.*$", "Enabled: no", stanza)
+        else:
+            stanzas[i] = stanza.rstrip("\n") + "\nEnabled: no" + stanza[len(stanza.rstrip("\n")) :]
+    return "".join(stanzas)
+
+
+def _deb822_stanza(repo: "DebianRepository") -> str:
+    """Returns the deb822 stanza defining a single repository."""
+    fields = {
+        "Types": repo.repotype,
+        "URIs": repo.uri,
+        "Suites": repo.release,
+        "Components": " ".join(repo.groups),
+    }
+    options = repo.options or {}
+    for field, option in DEB822_OPTIONS.items():
+        if option in options:
+            fields[field] = " ".join(options[option].split(","))
+    if repo.gpg_key:
+        fields["Signed-By"] = repo.gpg_key
+    if not repo.enabled:
+        fields["Enabled"] = "no"
+    return "".join("{}: {}\n".format(field, value) for field, value in fields.items())
+
+
+def _add_to_source(content: str, repo: "DebianRepository") -> str:
+    """Returns the content of a deb822 `.sources` file, with a repository added or updated.
+
+    The stanza of the repository is replaced, so it must not define any other repository unless
+    it already matches. A repository missing from the file gets a new stanza at the end.
+
+    Raises:
+        InvalidSourceError if the deb822 stanza also defines other repositories
+    """
+    stanza_text = _deb822_stanza(repo)
+    stanzas = re.split(r"(\n[ \t]*\n)", content)
+    for i, stanza in enumerate(stanzas):
+        fields = _parse_deb822_stanza(stanza)
+        repos = RepositoryMapping._parse_deb822_fields(fields, repo.filename)
+        existing = [
+            r
+            for r in repos
+            if (r.repotype, r.uri, r.release) == (repo.repotype, repo.uri, repo.release)
+        ]
+        if not existing:
+            continue
+        if _deb822_stanza(existing[0]) == stanza_text:
+            return content
+        if len(repos) > 1:
+            raise InvalidSourceError(
+                "Cannot update {} {} {} alone, other repositories share its stanza in {}".format(
+                    repo.repotype, repo.uri, repo.release, repo.filename
+                )
+            )
+        comments = "".join(
+            line for line in stanza.splitlines(keepends=True) if line.startswith("#")
+        )
+        trailing = stanza[len(stanza.rstrip("\n")) :]
+        stanzas[i] = comments + stanza_text.rstrip("\n") + trailing
+        return "".join(stanzas)
+
+    if not content.strip():
+        return stanza_text
+    return content + ("\n" if content.endswith("\n") else "\n\n") + stanza_text
+
+
 class RepositoryMapping(Mapping):
     """An representation of known repositories.
 
@@ -1156,6 +2068,10 @@ class RepositoryMapping(Mapping):
     filesystem, parse out repository files in `/etc/apt/...`, and create
     `DebianRepository` objects in this list.
 
+    Both one-line style `.list` files and deb822 style `.sources` files are read. The
+    repositories parsed from a file are cached for the process, until the file changes, so that
+    building a new `RepositoryMapping` only parses the files changed since.
+
     Typical usage:
 
         repositories = apt.RepositoryMapping()
@@ -1163,20 +2079,28 @@ class RepositoryMapping(Mapping):
             enabled=True, repotype="deb", uri="https://example.com", release="focal",
             groups=["universe"]
         ))
+
+    Changes made within `batch` are written once per file, when the block exits:
+
+        with repositories.batch():
+            for repo in old_repositories:
+                repositories.disable(repo)
     """
 
     def __init__(self):
         self._repository_map = {}
+        self._pending: Optional[Dict[str, str]] = None
         # Repositories that we're adding -- used to implement mode param
-        self.default_file = "/etc/apt/sources.list"
+        self.default_file = APT_SOURCES_LIST_PATH
 
         # read sources.list if it exists
         if os.path.isfile(self.default_file):
             self.load(self.default_file)
 
         # read sources.list.d
-        for file in glob.iglob("/etc/apt/sources.list.d/*.list"):
-            self.load(file)
+        for pattern in _sources_patterns()[1:]:
+            for file in sorted(glob.glob(pattern)):
+                self.load(file)
 
     def __contains__(self, key: str) -> bool:
         """Magic method for checking presence of repo in mapping."""
@@ -1204,29 +2128,146 @@ class RepositoryMapping(Mapping):
         Args:
           filename: the path to the repository file
         """
-        parsed = []
-        skipped = []
-        with open(filename, "r") as f:
-            for n, line in enumerate(f):
-                try:
-                    repo = self._parse(line, filename)
-                except InvalidSourceError:
-                    skipped.append(n)
-                else:
-                    repo_identifier = "{}-{}-{}".format(repo.repotype, repo.uri, repo.release)
-                    self._repository_map[repo_identifier] = repo
-                    parsed.append(n)
-                    logger.debug("parsed repo: '%s'", repo_identifier)
+        repos_args, skipped = self._cached_repository_args(filename)
+        for args in repos_args:
+            repo = DebianRepository(*args[:4], list(args[4]), *args[5:7], dict(args[7]))
+            repo_identifier = "{}-{}-{}".format(repo.repotype, repo.uri, repo.release)
+            self._repository_map[repo_identifier] = repo
+            logger.debug("parsed repo: '%s'", repo_identifier)
 
         if skipped:
             skip_list = ", ".join(str(s) for s in skipped)
             logger.debug("skipped the following lines in file '%s': %s", filename, skip_list)
 
-        if parsed:
-            logger.info("parsed %d apt package repositories", len(parsed))
+        if repos_args:
+            logger.info("parsed %d apt package repositories", len(repos_args))
         else:
             raise InvalidSourceError("all repository lines in '{}' were invalid!".format(filename))
 
+    @staticmethod
+    def _cached_repository_args(filename: str) -> Tuple[List[Tuple], List[int]]:
+        """Parse a sources file, unless it is unchanged since it was last parsed.
+
+        Returns:
+          a tuple of the arguments of every repository in the file, as returned by
+          `_repository_args`, and the numbers of the lines which could not be parsed
+        """
+        stat = os.stat(filename)
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = _sources_cache.get(filename)
+        if cached is None or cached[0] != key:
+            with open(filename, "r") as f:
+                content = f.read()
+            if filename.endswith(".sources"):
+                repos, skipped = RepositoryMapping._parse_deb822(content, filename), []
+            else:
+                repos, skipped = RepositoryMapping._parse_lines(content, filename)
+            cached = key, [RepositoryMapping._repository_args(repo) for repo in repos], skipped
+            _sources_cache[filename] = cached
+        else:
+            logger.debug("file '%s' unchanged, using cached repositories", filename)
+        return cached[1], cached[2]
+
+    @staticmethod
+    def _repository_args(repo: DebianRepository) -> Tuple:
+        """Returns the arguments to construct a copy of a repository."""
+        return (
+            repo.enabled,
+            repo.repotype,
+            repo.uri,
+            repo.release,
+            tuple(repo.groups),
+            repo.filename,
+            repo.gpg_key,
+            tuple((repo.options or {}).items()),
+        )
+
+    @staticmethod
+    def _parse_lines(content: str, filename: str) -> Tuple[List[DebianRepository], List[int]]:
+        """Parse the lines of a one-line style sources file.
+
+        Returns:
+          a tuple of the repositories, and the numbers of the lines which could not be parsed
+        """
+        repos, skipped = [], []
+        for n, line in enumerate(content.splitlines()):
+            try:
+                repos.append(RepositoryMapping._parse(line, filename))
+            except InvalidSourceError:
+                skipped.append(n)
+        return repos, skipped
+
+    @staticmethod
+    def _parse_deb822(content: str, filename: str) -> List[DebianRepository]:
+        """Parse the stanzas of a deb822 style `.sources` file."""
+        repos = []
+        for stanza in re.split(r"\n[ \t]*\n", content):
+            fields = _parse_deb822_stanza(stanza)
+            repos.extend(RepositoryMapping._parse_deb822_fields(fields, filename))
+        return repos
+
+    @staticmethod
+    def _parse_deb822_fields(fields: Dict[str, str], filename: str) -> List[DebianRepository]:
+        """Create the repositories defined by the fields of a deb822 stanza.
+
+        A stanza defines a repository for every combination of its types, URIs and suites.
+        """
+        enabled = fields.get("Enabled", "yes").lower() != "no"
+        signed_by = fields.get("Signed-By", "")
+        # an embedded key block is not a key file apt-get or `gpg_key` users can refer to
+        gpg_key = "" if "\n" in signed_by else signed_by
+        options = {
+            option: ",".join(fields[field].split())
+            for field, option in DEB822_OPTIONS.items()
+            if field in fields
+        }
+
+        return [
+            DebianRepository(
+                enabled,
+                repotype,
+                uri,
+                suite,
+                fields.get("Components", "").split(),
+                filename,
+                gpg_key,
+                dict(options),
+            )
+            for repotype in fields.get("Types", "").split()
+            if repotype in VALID_SOURCE_TYPES
+            for uri in fields.get("URIs", "").split()
+            for suite in fields.get("Suites", "").split()
+        ]
+
+    @contextmanager
+    def batch(self) -> Iterator["RepositoryMapping"]:
+        """Group the changes to the repository files, to write each file once at the end.
+
+        Every file is replaced atomically. Nothing is written if the block raises.
+        """
+        self._pending = {}
+        try:
+            yield self
+        except BaseException:
+            self._pending = None
+            raise
+
+        pending, self._pending = self._pending, None
+        for filename, content in pending.items():
+            _write_file_atomic(filename, content)
+
+    def _read_source(self, filename: str) -> str:
+        if self._pending is not None and filename in self._pending:
+            return self._pending[filename]
+        with open(filename, "r") as f:
+            return f.read()
+
+    def _write_source(self, filename: str, content: str) -> None:
+        if self._pending is not None:
+            self._pending[filename] = content
+        else:
+            _write_file_atomic(filename, content)
+
     @staticmethod
     def _parse(line: str, filename: str) -> DebianRepository:
         """Parse a line in a sources.list file.
@@ -1285,6 +2326,9 @@ class RepositoryMapping(Mapping):
     def add(self, repo: DebianRepository, default_filename: Optional[bool] = False) -> None:
         """Add a new repository to the system.
 
+        A repository from a deb822 `.sources` file is written as a stanza of that file, and
+        any other repository as a one-line entry in its `.list` file.
+
         Args:
           repo: a `DebianRepository` object
           default_filename: an (Optional) filename if the default is not desirable
@@ -1295,18 +2339,25 @@ class RepositoryMapping(Mapping):
 
         fname = repo.filename or new_filename
 
+        if fname.endswith(".sources"):
+            try:
+                content = self._read_source(fname)
+            except FileNotFoundError:
+                content = ""
+            self._write_source(fname, _add_to_source(content, repo))
+            self._repository_map["{}-{}-{}".format(repo.repotype, repo.uri, repo.release)] = repo
+            return
+
         options = repo.options if repo.options else {}
         if repo.gpg_key:
             options["signed-by"] = repo.gpg_key
 
-        with open(fname, "wb") as f:
-            f.write(
-                (
-                    "{}".format("#" if not repo.enabled else "")
-                    + "{} {}{} ".format(repo.repotype, repo.make_options_string(), repo.uri)
-                    + "{} {}\n".format(repo.release, " ".join(repo.groups))
-                ).encode("utf-8")
-            )
+        self._write_source(
+            fname,
+            "{}".format("#" if not repo.enabled else "")
+            + "{} {}{} ".format(repo.repotype, repo.make_options_string(), repo.uri)
+            + "{} {}\n".format(repo.release, " ".join(repo.groups)),
+        )
 
         self._repository_map["{}-{}-{}".format(repo.repotype, repo.uri, repo.release)] = repo
 
@@ -1316,14 +2367,8 @@ class RepositoryMapping(Mapping):
         Args:
           repo: a `DebianRepository` to disable
         """
-        searcher = "{} {}{} {}".format(
-            repo.repotype, repo.make_options_string(), repo.uri, repo.release
+        self._write_source(
+            repo.filename, _disable_in_source(self._read_source(repo.filename), repo)
         )
 
-        for line in fileinput.input(repo.filename, inplace=True):
-            if re.match(r"^{}\s".format(re.escape(searcher)), line):
-                print("# {}".format(line), end="")
-            else:
-                print(line, end="")
-
         self._repository_map["{}-{}-{}".format(repo.repotype, repo.uri, repo.release)] = repo
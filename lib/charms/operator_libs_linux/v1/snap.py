@@ -25,6 +25,9 @@ the `snapd` HTTP API.
 `SnapCache` objects can be used to install or modify Snap packages by name in a manner similar to
 using the `snap` command from the commandline.
 
+:meth:`get_cache` returns a process-wide, lazily-loaded `SnapCache` shared with the "bare" methods
+below. It is rebuilt after a TTL, or once a snap operation made by this process completes.
+
 An example of adding Juju to the system with `SnapCache` and setting a config value:
 
 ```python
@@ -39,6 +42,41 @@ except snap.SnapError as e:
     logger.error("An exception occurred when installing charmcraft. Reason: %s", e.message)
 ```
 
+`Snap` objects can also submit operations to snapd without forking the `snap` command or waiting
+for them, with the `request_*` methods. These return snapd change IDs, which can be waited on
+together:
+
+```python
+client = snap.SnapClient()
+cache = snap.get_cache()
+changes = [
+    cache["kafka"].request_restart(services=["kafka"]),
+    cache["juju"].request_refresh(channel="3/stable"),
+]
+client.wait_changes(changes)
+```
+
+A refresh across the units of an application can be kept off the critical path by pinning a
+cohort, downloading the revision everywhere in parallel, then switching each unit in turn:
+
+```python
+kafka = snap.get_cache()["kafka"]
+cohort = kafka.create_cohort()  # on one unit, shared with the others
+kafka.download("/var/cache/kafka", channel="3/stable", cohort=cohort)  # on every unit
+...
+kafka.install_downloaded(*kafka.get_downloaded("/var/cache/kafka"), cohort=cohort)  # in turn
+```
+
+Timing of snapd requests and `snap` commands can be collected by registering a callback, such as
+a `SnapMetrics` registry, with :meth:`add_instrumentation_hook`:
+
+```python
+metrics = snap.SnapMetrics()
+snap.add_instrumentation_hook(metrics)
+...
+logger.debug("snap operations: %s", metrics.summary())
+```
+
 In addition, the `snap` module provides "bare" methods which can act on Snap packages as
 simple function calls. :meth:`add`, :meth:`remove`, and :meth:`ensure` are provided, as
 well as :meth:`add_local` for installing directly from a local `.snap` file. These return
@@ -56,13 +94,19 @@ except snap.SnapError as e:
 ```
 """
 
+import glob
 import http.client
 import json
 import logging
+import mmap
 import os
+import re
+import select
 import socket
 import subprocess
 import sys
+import threading
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -70,7 +114,7 @@ from collections.abc import Mapping
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 from subprocess import CalledProcessError, CompletedProcess
-from typing import Any, Dict, Iterable, List, Optional, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
@@ -82,13 +126,14 @@ LIBAPI = 1
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 4
+LIBPATCH = 18
+
+SNAPD_SOCKET_PATH = "/run/snapd.socket"
 
 
 def _cache_init(func):
     def inner(*args, **kwargs):
-        if _Cache.cache is None:
-            _Cache.cache = SnapCache()
+        get_cache()
         return func(*args, **kwargs)
 
     return inner
@@ -98,6 +143,95 @@ def _cache_init(func):
 JSONType = Union[Dict[str, Any], List[Any], str, int, float]
 
 
+class SnapOperationEvent:
+    """Data wrapper for the timing of a snapd API request or a `snap` command."""
+
+    def __init__(
+        self,
+        kind: str,
+        operation: str,
+        duration: float,
+        status: Optional[int] = None,
+        request_size: int = 0,
+        response_size: int = 0,
+    ):
+        self.kind = kind
+        self.operation = operation
+        self.duration = duration
+        self.status = status
+        self.request_size = request_size
+        self.response_size = response_size
+
+    def __repr__(self):
+        """String representation of the event."""
+        return "<{}.{}: {}>".format(self.__module__, self.__class__.__name__, self.__dict__)
+
+    @property
+    def failed(self) -> bool:
+        """Whether the request or command failed."""
+        if self.kind == "api":
+            return self.status is None or not 200 <= self.status < 300
+        return self.status != 0
+
+
+class SnapMetrics:
+    """Registry aggregating `SnapOperationEvent` durations and sizes per operation.
+
+    Register an instance with `add_instrumentation_hook(metrics)` to start collecting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+
+    def __call__(self, event: SnapOperationEvent) -> None:
+        """Record an event."""
+        key = "{} {}".format(event.kind, event.operation)
+        with self._lock:
+            stats = self.operations.setdefault(
+                key, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0, "bytes": 0}
+            )
+            stats["count"] += 1
+            stats["errors"] += int(event.failed)
+            stats["total"] += event.duration
+            stats["max"] = max(stats["max"], event.duration)
+            stats["bytes"] += event.request_size + event.response_size
+
+    def summary(self) -> Dict[str, Dict]:
+        """Returns the aggregated metrics, slowest operations first."""
+        with self._lock:
+            ordered = sorted(self.operations.items(), key=lambda i: i[1]["total"], reverse=True)
+            return {key: dict(stats) for key, stats in ordered}
+
+
+_instrumentation_hooks = []
+
+
+def add_instrumentation_hook(callback: Callable[[SnapOperationEvent], None]) -> None:
+    """Register a callback called with a `SnapOperationEvent` after each snapd request or command.
+
+    Args:
+        callback: a callable taking a `SnapOperationEvent`, e.g. a `SnapMetrics` instance
+    """
+    if callback not in _instrumentation_hooks:
+        _instrumentation_hooks.append(callback)
+
+
+def remove_instrumentation_hook(callback: Callable[[SnapOperationEvent], None]) -> None:
+    """Unregister a callback registered with `add_instrumentation_hook`."""
+    if callback in _instrumentation_hooks:
+        _instrumentation_hooks.remove(callback)
+
+
+def _emit(event: SnapOperationEvent) -> None:
+    """Pass an event to the instrumentation hooks, which must not break snap operations."""
+    for callback in list(_instrumentation_hooks):
+        try:
+            callback(event)
+        except Exception as e:
+            logger.debug("Instrumentation hook {!r} failed: {}".format(callback, e))
+
+
 class SnapService:
     """Data wrapper for snap services."""
 
@@ -127,6 +261,55 @@ class SnapService:
         }
 
 
+class SnapLogRecord:
+    """Data wrapper for a snap service log record."""
+
+    def __init__(
+        self,
+        timestamp: Optional[datetime] = None,
+        service: str = "",
+        pid: str = "",
+        message: str = "",
+    ):
+        self.timestamp = timestamp
+        self.service = service
+        self.pid = pid
+        self.message = message
+
+    def __repr__(self):
+        """String representation of the log record."""
+        return "<{}.{}: {}>".format(self.__module__, self.__class__.__name__, self.__dict__)
+
+    @staticmethod
+    def _parse_timestamp(timestamp: str) -> Optional[datetime]:
+        """Parse an RFC 3339 timestamp from snapd, with up to nanosecond precision."""
+        if not timestamp:
+            return None
+        match = re.match(
+            r"^(\d{4}-\d{2}-\d{2}[Tt ]\d{2}:\d{2}:\d{2})(?:\.(\d+))?([Zz]|[+-]\d{2}:\d{2})?$",
+            timestamp,
+        )
+        if not match:
+            return None
+        base, fraction, offset = match.groups()
+        fraction = ".{}".format(fraction[:6].ljust(6, "0")) if fraction else ""
+        offset = "+00:00" if offset in (None, "Z", "z") else offset
+        try:
+            return datetime.fromisoformat("{}{}{}".format(base, fraction, offset))
+        except ValueError:
+            return None
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "SnapLogRecord":
+        """Build a log record from the snapd API representation."""
+        return cls(
+            timestamp=cls._parse_timestamp(record.get("timestamp", "")),
+            service=record.get("sid", ""),
+            pid=record.get("pid", ""),
+            message=record.get("message", ""),
+        )
+
+
 class MetaCache(type):
     """MetaCache class used for initialising the snap cache."""
 
@@ -139,14 +322,33 @@ class MetaCache(type):
     def cache(cls, cache: "SnapCache") -> None:
         """Setter for the snap cache."""
         cls._cache = cache
+        cls._loaded_at = time.monotonic()
+
+    @property
+    def expired(cls) -> bool:
+        """Property for whether the snap cache is missing or older than its TTL."""
+        return cls._cache is None or time.monotonic() - cls._loaded_at > cls.ttl
+
+    def track_change(cls, change_id: str) -> None:
+        """Record a snapd change started by this process."""
+        cls._changes.add(change_id)
+
+    def complete_change(cls, change_id: str) -> None:
+        """Invalidate the snap cache if a change started by this process is ready."""
+        if change_id in cls._changes:
+            cls._changes.discard(change_id)
+            cls._cache = None
 
     def __getitem__(cls, name) -> "Snap":
-        """Snap cache getter."""
-        return cls._cache[name]
+        """Snap cache getter, rebuilding the cache if it was invalidated."""
+        return get_cache()[name]
 
 
 class _Cache(object, metaclass=MetaCache):
     _cache = None
+    _loaded_at = 0.0
+    _changes = set()
+    ttl = 60.0
 
 
 class Error(Exception):
@@ -269,15 +471,42 @@ class Snap(object):
           SnapError if there is a problem encountered
         """
         optargs = optargs or []
-        _cmd = ["snap", command, self._name, *optargs]
+        return self._snap_command([command, self._name, *optargs])
+
+    def _snap_command(self, args: List[str]) -> str:
+        """Run a `snap` command, reporting its timing to the instrumentation hooks.
+
+        Args:
+          args: the arguments to pass to `snap`, starting with the command
+
+        Raises:
+          SnapError if there is a problem encountered
+        """
+        _cmd = ["snap", *args]
+        start = time.monotonic()
+        returncode, output = None, ""
         try:
-            return subprocess.check_output(_cmd, universal_newlines=True)
+            output = subprocess.check_output(_cmd, universal_newlines=True)
+            returncode = 0
+            return output
         except CalledProcessError as e:
+            returncode, output = e.returncode, e.output or ""
             raise SnapError(
                 "Snap: {!r}; command {!r} failed with output = {!r}".format(
                     self._name, _cmd, e.output
                 )
             )
+        finally:
+            if _instrumentation_hooks:
+                _emit(
+                    SnapOperationEvent(
+                        "cli",
+                        "snap {}".format(args[0]),
+                        time.monotonic() - start,
+                        returncode,
+                        response_size=len(output),
+                    )
+                )
 
     def _snap_daemons(
         self,
@@ -291,11 +520,26 @@ class Snap(object):
             services = [self._name]
 
         _cmd = ["snap", *command, *services]
-
+        start = time.monotonic()
+        returncode, output = None, ""
         try:
-            return subprocess.run(_cmd, universal_newlines=True, check=True, capture_output=True)
+            result = subprocess.run(_cmd, universal_newlines=True, check=True, capture_output=True)
+            returncode, output = result.returncode, result.stdout or ""
+            return result
         except CalledProcessError as e:
+            returncode, output = e.returncode, e.stdout or ""
             raise SnapError("Could not {} for snap [{}]: {}".format(_cmd, self._name, e.stderr))
+        finally:
+            if _instrumentation_hooks:
+                _emit(
+                    SnapOperationEvent(
+                        "cli",
+                        "snap {}".format(command[0]),
+                        time.monotonic() - start,
+                        returncode,
+                        response_size=len(output),
+                    )
+                )
 
     def get(self, key) -> str:
         """Gets a snap configuration value.
@@ -315,6 +559,65 @@ class Snap(object):
 
         return self._snap("set", [*args])
 
+    def get_config(self, keys: Optional[List[str]] = None) -> Dict:
+        """Gets the snap configuration in a single query to snapd.
+
+        Args:
+            keys: (optional) the keys to retrieve, otherwise the whole configuration tree
+        """
+        try:
+            return self._snap_client.get_snap_conf(self._name, keys)
+        except SnapAPIError as e:
+            raise SnapError("Could not get config for snap [{}]: {}".format(self._name, e.message))
+
+    @staticmethod
+    def _flatten_config(config: Dict, prefix: str = "") -> Dict:
+        """Flattens a nested configuration tree into a dict of dotted keys."""
+        flat = {}
+        for key, value in config.items():
+            if isinstance(value, dict) and value:
+                flat.update(Snap._flatten_config(value, "{}{}.".format(prefix, key)))
+            else:
+                flat["{}{}".format(prefix, key)] = value
+        return flat
+
+    def update_config(self, config: Dict, timeout: float = 600) -> bool:
+        """Sets the snap configuration values which differ from the current ones.
+
+        The current configuration is read in a single query, and only the changed keys are
+        written, in a single change. Values are stored as JSON types, and a `None` value unsets
+        the key.
+
+        Args:
+            config: a dict of (possibly dotted) keys to their desired values
+            timeout: the maximum time to wait for the change, in seconds. Default is 600s.
+
+        Returns:
+            True if any value was changed, False if the configuration was already up to date.
+
+        Raises:
+            SnapError if the configuration could not be read or written
+        """
+        current = self._flatten_config(self.get_config())
+        desired = self._flatten_config(config)
+
+        diff = {key: value for key, value in desired.items() if current.get(key) != value}
+        if not diff:
+            return False
+
+        try:
+            change_id = self._snap_client.put_snap_conf(self._name, diff)
+        except SnapAPIError as e:
+            raise SnapError("Could not set config for snap [{}]: {}".format(self._name, e.message))
+        try:
+            self._snap_client.wait_change(change_id, timeout=timeout)
+        except SnapAPIError as e:
+            raise SnapError(
+                "Could not set config for snap [{}]: {}".format(self._name, e.message)
+            ) from None
+        logger.debug("Updated config for snap {}: {}".format(self._name, sorted(diff)))
+        return True
+
     def unset(self, key) -> str:
         """Unsets a snap configuration value.
 
@@ -354,6 +657,38 @@ class Snap(object):
         args = ["logs", "-n={}".format(num_lines)] if num_lines else ["logs"]
         return self._snap_daemons(args, services).stdout
 
+    def stream_logs(
+        self,
+        services: Optional[List[str]] = None,
+        num_lines: Optional[int] = 10,
+        follow: Optional[bool] = False,
+    ) -> Iterator[SnapLogRecord]:
+        """Lazily yields a snap services' log records, without holding them all in memory.
+
+        Records are filtered by service and count by snapd. With `follow`, the generator keeps
+        yielding new records as they are logged until it is closed.
+
+        Args:
+            services (list): (optional) list of individual snap services to show logs from
+                (otherwise all)
+            num_lines (int): (optional) integer number of past log records to start with.
+                Default `10`
+            follow (bool): (optional) flag to keep following the logs. Default `False`
+
+        Raises:
+            SnapError if the logs could not be read
+        """
+        if services:
+            names = ["{}.{}".format(self._name, service) for service in services]
+        else:
+            names = [self._name]
+
+        try:
+            for record in self._snap_client.stream_logs(names, num_lines, bool(follow)):
+                yield SnapLogRecord.from_dict(record)
+        except SnapAPIError as e:
+            raise SnapError("Could not read logs for snap [{}]: {}".format(self._name, e.message))
+
     def restart(
         self, services: Optional[List[str]] = None, reload: Optional[bool] = False
     ) -> None:
@@ -368,6 +703,52 @@ class Snap(object):
         args = ["restart", "--reload"] if reload else ["restart"]
         self._snap_daemons(args, services)
 
+    def wait_for_services(
+        self,
+        states: Dict[str, str],
+        timeout: float = 60,
+        min_interval: float = 0.1,
+        max_interval: float = 2.0,
+    ) -> None:
+        """Waits until a snap's services reach the given states.
+
+        Service states are polled from snapd, with a delay doubling from `min_interval` up to
+        `max_interval`, so that the wait ends shortly after the services settle.
+
+        Args:
+            states (dict): a dict of service name to desired state, "active" or "inactive"
+            timeout (float): (optional) the maximum time to wait, in seconds. Default `60`
+            min_interval (float): (optional) the initial delay between two polls, in seconds
+            max_interval (float): (optional) the maximum delay between two polls, in seconds
+
+        Raises:
+            SnapError if the services did not reach the states before the timeout
+        """
+        for state in states.values():
+            if state not in ("active", "inactive"):
+                raise ValueError(
+                    "service state must be 'active' or 'inactive', not {!r}".format(state)
+                )
+
+        deadline = time.monotonic() + timeout
+        interval = min_interval
+        while True:
+            self._update_snap_apps()
+            current = {
+                app["name"]: "active" if app.get("active") else "inactive" for app in self._apps
+            }
+            pending = {s: state for s, state in states.items() if current.get(s) != state}
+            if not pending:
+                return
+
+            if time.monotonic() + interval > deadline:
+                pending_str = ", ".join("{} {}".format(s, st) for s, st in sorted(pending.items()))
+                raise SnapError(
+                    "Timed out waiting for snap [{}] services: {}".format(self._name, pending_str)
+                )
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+
     def _install(self, channel: Optional[str] = "", cohort: Optional[str] = "") -> None:
         """Add a snap to the system.
 
@@ -418,6 +799,220 @@ class Snap(object):
         """Removes a snap from the system."""
         return self._snap("remove")
 
+    def create_cohort(self) -> str:
+        """Create a cohort for the snap, returning its key.
+
+        Raises:
+          SnapError if snapd could not create the cohort
+        """
+        try:
+            return self._snap_client.create_cohorts([self._name])[self._name]
+        except (SnapAPIError, KeyError) as e:
+            raise SnapError("Snap: {!r}; could not create cohort: {}".format(self._name, e))
+
+    def download(
+        self, target_dir: str, channel: Optional[str] = "", cohort: Optional[str] = ""
+    ) -> Tuple[str, str]:
+        """Download the snap and its assertions without installing it.
+
+        Pre-downloading on every unit of an application, then calling `install_downloaded` in
+        turn, keeps the store download out of a rolling refresh.
+
+        Args:
+          target_dir: the directory to download the `.snap` and `.assert` files to
+          channel: the channel to download from
+          cohort: optional, the key of a cohort to download the revision of
+
+        Returns:
+          A tuple of the paths to the downloaded snap and assertion files
+
+        Raises:
+          SnapError if the download failed
+        """
+        cohort = cohort or self._cohort
+
+        args = ["--target-directory={}".format(target_dir)]
+        if channel:
+            args.append("--channel={}".format(channel))
+        if cohort:
+            args.append("--cohort={}".format(cohort))
+
+        self._snap("download", args)
+        return self.get_downloaded(target_dir)
+
+    def get_downloaded(self, target_dir: str) -> Tuple[str, str]:
+        """Get the paths to the most recent download of the snap in a directory.
+
+        Raises:
+          SnapError if no complete download of the snap is found
+        """
+        snaps = sorted(
+            glob.glob(os.path.join(target_dir, "{}_*.snap".format(self._name))),
+            key=os.path.getmtime,
+        )
+        for snap_path in reversed(snaps):
+            assert_path = snap_path[: -len(".snap")] + ".assert"
+            if os.path.exists(assert_path):
+                return snap_path, assert_path
+
+        raise SnapError("Snap: {!r}; no download found in {}".format(self._name, target_dir))
+
+    def install_downloaded(
+        self,
+        snap_path: str,
+        assert_path: str,
+        channel: Optional[str] = "",
+        cohort: Optional[str] = "",
+    ) -> None:
+        """Switch the snap to a revision fetched with `download`.
+
+        The assertions are acknowledged first, so the revision is installed as the store revision
+        rather than a dangerous local one. The snap is then refreshed to track `channel` and
+        `cohort`, which does not download anything since the revision is already installed.
+
+        Args:
+          snap_path: the path to the downloaded `.snap` file
+          assert_path: the path to the downloaded `.assert` file
+          channel: the channel to track
+          cohort: optional, the key of a cohort to join
+
+        Raises:
+          SnapError if the snap could not be installed
+        """
+        self._snap_command(["ack", assert_path])
+
+        args = ["--classic"] if self.confinement == "classic" else []
+        self._snap_command(["install", snap_path, *args])
+
+        if channel or cohort:
+            self._refresh(channel, cohort)
+
+        invalidate_cache()
+        self._update_snap_apps()
+        self._state = SnapState.Present
+
+    def _snap_api(self, action: str, options: Optional[Dict] = None) -> str:
+        """Submit a snap operation to snapd, without waiting for it to finish.
+
+        Args:
+          action: the snapd action to perform, e.g. "install" or "refresh"
+          options: an (optional) dict of action options, commonly channel or cohort-key
+
+        Returns:
+          The ID of the snapd change performing the operation
+
+        Raises:
+          SnapError if snapd refused the operation
+        """
+        try:
+            return self._snap_client.snap_action(self._name, action, options)
+        except SnapAPIError as e:
+            raise SnapError(
+                "Snap: {!r}; action {!r} refused: {}".format(self._name, action, e.message)
+            )
+
+    def _snap_daemons_api(
+        self,
+        action: str,
+        services: Optional[List[str]] = None,
+        options: Optional[Dict] = None,
+    ) -> str:
+        """Submit a service operation to snapd, without waiting for it to finish."""
+        if services:
+            names = ["{}.{}".format(self._name, service) for service in services]
+        else:
+            names = [self._name]
+
+        try:
+            return self._snap_client.app_action(names, action, options)
+        except SnapAPIError as e:
+            raise SnapError(
+                "Could not {} {} for snap [{}]: {}".format(action, names, self._name, e.message)
+            )
+
+    def request_install(self, channel: Optional[str] = "", cohort: Optional[str] = "") -> str:
+        """Submit the installation of the snap to snapd, returning the change ID.
+
+        The state of this `Snap` is not updated; use `get_cache` once the change is ready.
+
+        Args:
+          channel: the channel to install from
+          cohort: optional, the key of a cohort that this snap belongs to
+        """
+        options = {}
+        if self.confinement == "classic":
+            options["classic"] = True
+        if channel:
+            options["channel"] = channel
+        if cohort or self._cohort:
+            options["cohort-key"] = cohort or self._cohort
+
+        return self._snap_api("install", options)
+
+    def request_refresh(
+        self,
+        channel: Optional[str] = "",
+        cohort: Optional[str] = "",
+        leave_cohort: Optional[bool] = False,
+    ) -> str:
+        """Submit a refresh of the snap to snapd, returning the change ID.
+
+        Args:
+          channel: the channel to install from
+          cohort: optionally, specify a cohort.
+          leave_cohort: leave the current cohort.
+        """
+        options = {}
+        if channel:
+            options["channel"] = channel
+
+        if leave_cohort:
+            self._cohort = ""
+            options["leave-cohort"] = True
+        elif cohort or self._cohort:
+            options["cohort-key"] = cohort or self._cohort
+
+        return self._snap_api("refresh", options)
+
+    def request_remove(self) -> str:
+        """Submit the removal of the snap to snapd, returning the change ID."""
+        return self._snap_api("remove")
+
+    def request_start(
+        self, services: Optional[List[str]] = None, enable: Optional[bool] = False
+    ) -> str:
+        """Submit the start of a snap's services to snapd, returning the change ID.
+
+        Args:
+            services (list): (optional) list of individual snap services to start (otherwise all)
+            enable (bool): (optional) flag to enable snap services on start. Default `false`
+        """
+        return self._snap_daemons_api("start", services, {"enable": True} if enable else None)
+
+    def request_stop(
+        self, services: Optional[List[str]] = None, disable: Optional[bool] = False
+    ) -> str:
+        """Submit the stop of a snap's services to snapd, returning the change ID.
+
+        Args:
+            services (list): (optional) list of individual snap services to stop (otherwise all)
+            disable (bool): (optional) flag to disable snap services on stop. Default `False`
+        """
+        return self._snap_daemons_api("stop", services, {"disable": True} if disable else None)
+
+    def request_restart(
+        self, services: Optional[List[str]] = None, reload: Optional[bool] = False
+    ) -> str:
+        """Submit the restart of a snap's services to snapd, returning the change ID.
+
+        Args:
+            services (list): (optional) list of individual snap services to restart.
+                (otherwise all)
+            reload (bool): (optional) flag to use the service reload command, if available.
+                Default `False`
+        """
+        return self._snap_daemons_api("restart", services, {"reload": True} if reload else None)
+
     @property
     def name(self) -> str:
         """Returns the name of the snap."""
@@ -460,6 +1055,7 @@ class Snap(object):
                 # The snap is installed, but we are changing it (e.g., switching channels).
                 self._refresh(channel, cohort)
 
+        invalidate_cache()
         self._update_snap_apps()
         self._state = state
 
@@ -565,6 +1161,136 @@ class _UnixSocketHandler(urllib.request.AbstractHTTPHandler):
         return self.do_open(_UnixSocketConnection, req, socket_path=self.socket_path)
 
 
+class _UnixSocketConnectionPool:
+    """A small pool of keep-alive HTTP/1.1 connections to a named Unix socket.
+
+    A connection is handed out again once the response to its last request has been fully read,
+    unless the server has closed it in the meantime. Requests which could not be sent on a reused
+    connection, and idempotent requests whose response could not be read from one, are retried
+    on a new connection.
+    """
+
+    _IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+    def __init__(self, socket_path: str, size: int = 4):
+        self.socket_path = socket_path
+        self.size = size
+        self._lock = threading.Lock()
+        self._connections = []
+
+    @staticmethod
+    def _is_dropped(sock: socket.socket) -> bool:
+        """Check without blocking whether the server closed an idle connection.
+
+        An idle connection has nothing to read, so a readable socket is either at EOF or holds
+        data which no request asked for. Neither can be reused.
+        """
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def _acquire(self, timeout: float) -> Tuple["_UnixSocketConnection", bool]:
+        """Get an idle connection from the pool, or a new one if none is idle."""
+        dropped = []
+        with self._lock:
+            for entry in list(self._connections):
+                connection, response = entry
+                if response is None or not response.isclosed():
+                    continue
+                if connection.sock is not None and self._is_dropped(connection.sock):
+                    self._connections.remove(entry)
+                    dropped.append(connection)
+                    continue
+                entry[1] = None
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                break
+            else:
+                connection = None
+
+        for stale in dropped:
+            logger.debug("Dropping snapd connection closed by the server")
+            stale.close()
+        if connection is not None:
+            return connection, connection.sock is not None
+        return _UnixSocketConnection("localhost", timeout, socket_path=self.socket_path), False
+
+    def _release(self, connection: "_UnixSocketConnection", response) -> None:
+        """Track the response in flight on a connection, pooling the connection if possible."""
+        with self._lock:
+            for entry in self._connections:
+                if entry[0] is connection:
+                    entry[1] = response
+                    return
+            if len(self._connections) < self.size:
+                self._connections.append([connection, response])
+
+    def _discard(self, connection: "_UnixSocketConnection") -> None:
+        """Close a connection and remove it from the pool."""
+        connection.close()
+        with self._lock:
+            self._connections = [e for e in self._connections if e[0] is not connection]
+
+    def request(
+        self, method: str, url: str, body: bytes, headers: Dict, timeout: float
+    ) -> http.client.HTTPResponse:
+        """Send a request and return the response, which must be read to free the connection."""
+        while True:
+            connection, reused = self._acquire(timeout)
+            try:
+                connection.request(method, url, body=body, headers=headers)
+            except (BrokenPipeError, ConnectionResetError):
+                # the server closed the connection before the request went out
+                self._discard(connection)
+                if reused:
+                    logger.debug("Stale snapd connection, resending {} {}".format(method, url))
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                self._discard(connection)
+                raise
+
+            try:
+                response = connection.getresponse()
+            except (ConnectionError, http.client.HTTPException):
+                self._discard(connection)
+                if reused and method in self._IDEMPOTENT_METHODS:
+                    logger.debug("Stale snapd connection, retrying {} {}".format(method, url))
+                    continue
+                raise
+            except OSError:
+                self._discard(connection)
+                raise
+
+            if response.will_close:
+                self._discard(connection)
+            else:
+                self._release(connection, response)
+            return response
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection, _ in connections:
+            connection.close()
+
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def _get_connection_pool(socket_path: str) -> _UnixSocketConnectionPool:
+    """Get the process-wide connection pool for a socket path."""
+    with _connection_pools_lock:
+        if socket_path not in _connection_pools:
+            _connection_pools[socket_path] = _UnixSocketConnectionPool(socket_path)
+        return _connection_pools[socket_path]
+
+
 class SnapClient:
     """Snapd API client to talk to HTTP over UNIX sockets.
 
@@ -575,7 +1301,7 @@ class SnapClient:
 
     def __init__(
         self,
-        socket_path: str = "/run/snapd.socket",
+        socket_path: Optional[str] = None,
         opener: Optional[urllib.request.OpenerDirector] = None,
         base_url: str = "http://localhost/v2/",
         timeout: float = 5.0,
@@ -583,15 +1309,16 @@ class SnapClient:
         """Initialize a client instance.
 
         Args:
-            socket_path: a path to the socket on the filesystem. Defaults to /run/snap/snapd.socket
-            opener: specifies an opener for unix socket, if unspecified a default is used
+            socket_path: a path to the socket on the filesystem. Defaults to `SNAPD_SOCKET_PATH`,
+                /run/snapd.socket
+            opener: specifies an opener for unix socket, if unspecified requests are sent over
+                keep-alive connections shared by all clients of the same socket
             base_url: base url for making requests to the snap client. Defaults to
                 http://localhost/v2/
             timeout: timeout in seconds to use when making requests to the API. Default is 5.0s.
         """
-        if opener is None:
-            opener = self._get_default_opener(socket_path)
         self.opener = opener
+        self.socket_path = socket_path or SNAPD_SOCKET_PATH
         self.base_url = base_url
         self.timeout = timeout
 
@@ -628,6 +1355,20 @@ class SnapClient:
         response = self._request_raw(method, path, query, headers, data)
         return json.loads(response.read().decode())["result"]
 
+    def _request_async(self, method: str, path: str, body: Dict = None) -> str:
+        """Make a JSON request to the Snapd server which starts a change, and return its ID.
+
+        Snapd answers requests which modify the system with an "async" response, carrying the
+        ID of the change it started instead of a result.
+        """
+        headers = {"Accept": "application/json", "Content-Type": "application/json"}
+        data = json.dumps(body or {}).encode("utf-8")
+
+        response = self._request_raw(method, path, None, headers, data)
+        change_id = json.loads(response.read().decode())["change"]
+        _Cache.track_change(change_id)
+        return change_id
+
     def _request_raw(
         self,
         method: str,
@@ -636,13 +1377,111 @@ class SnapClient:
         headers: Dict = None,
         data: bytes = None,
     ) -> http.client.HTTPResponse:
-        """Make a request to the Snapd server; return the raw HTTPResponse object."""
+        """Make a request to the Snapd server; return the raw HTTPResponse object.
+
+        The response must be read entirely for its connection to be reused.
+        """
+        if not _instrumentation_hooks:
+            return self._send_request(method, path, query, headers, data)
+
+        start = time.monotonic()
+        status, response_size = None, 0
+        try:
+            response = self._send_request(method, path, query, headers, data)
+            status = response.status
+            response_size = int(response.getheader("Content-Length") or 0)
+            return response
+        except SnapAPIError as e:
+            status = e.code
+            raise
+        finally:
+            _emit(
+                SnapOperationEvent(
+                    "api",
+                    "{} {}".format(method, path),
+                    time.monotonic() - start,
+                    status,
+                    request_size=len(data or b""),
+                    response_size=response_size,
+                )
+            )
+
+    def _send_request(
+        self,
+        method: str,
+        path: str,
+        query: Dict = None,
+        headers: Dict = None,
+        data: bytes = None,
+    ) -> http.client.HTTPResponse:
+        """Send a request to the Snapd server over the socket, or through the custom opener."""
         url = self.base_url + path
         if query:
             url = url + "?" + urllib.parse.urlencode(query)
 
         if headers is None:
             headers = {}
+
+        if self.opener is not None:
+            return self._request_opener(method, url, headers, data)
+
+        parsed_url = urllib.parse.urlsplit(url)
+        target = urllib.parse.urlunsplit(("", "", parsed_url.path, parsed_url.query, ""))
+        pool = _get_connection_pool(self.socket_path)
+        try:
+            response = pool.request(method, target, data, headers, self.timeout)
+        except (OSError, http.client.HTTPException) as e:
+            raise SnapAPIError({}, 500, "Not found", str(e))
+
+        self._check_status(response)
+        return response
+
+    @staticmethod
+    def _check_status(response: http.client.HTTPResponse) -> None:
+        """Raise a SnapAPIError if the response is not successful."""
+        if not 200 <= response.status < 300:
+            message = ""
+            try:
+                body = json.loads(response.read().decode())["result"]
+            except (IOError, ValueError, KeyError) as e2:
+                # Will only happen on read error or if snapd sends invalid JSON.
+                body = {}
+                message = "{} - {}".format(type(e2).__name__, e2)
+            raise SnapAPIError(body, response.status, response.reason, message)
+
+    def _request_stream(self, path: str, query: Dict = None, follow: bool = False) -> Iterator:
+        """Make a GET request to the Snapd server and yield the decoded JSON sequence records.
+
+        The request is sent on a dedicated connection, closed once the generator is exhausted
+        or closed, since a followed stream never completes. Following streams have no timeout.
+        """
+        url = urllib.parse.urlsplit(self.base_url + path)
+        target = urllib.parse.urlunsplit(
+            ("", "", url.path, urllib.parse.urlencode(query or {}), "")
+        )
+        connection = _UnixSocketConnection(
+            "localhost", None if follow else self.timeout, socket_path=self.socket_path
+        )
+        try:
+            try:
+                connection.request("GET", target, headers={"Accept": "application/json-seq"})
+                response = connection.getresponse()
+            except (OSError, http.client.HTTPException) as e:
+                raise SnapAPIError({}, 500, "Not found", str(e))
+            self._check_status(response)
+
+            # application/json-seq: each record is prefixed by RS and ends with a newline
+            for line in response:
+                line = line.strip(b"\x1e \r\n")
+                if line:
+                    yield json.loads(line.decode())
+        finally:
+            connection.close()
+
+    def _request_opener(
+        self, method: str, url: str, headers: Dict, data: bytes
+    ) -> http.client.HTTPResponse:
+        """Make a request to the Snapd server through a custom urllib opener."""
         request = urllib.request.Request(url, method=method, data=data, headers=headers)
 
         try:
@@ -666,6 +1505,10 @@ class SnapClient:
         """Get information about currently installed snaps."""
         return self._request("GET", "snaps")
 
+    def get_installed_snap(self, name: str) -> Dict:
+        """Query the snap server for information about a single, currently installed snap."""
+        return self._request("GET", "snaps/{}".format(name))
+
     def get_snap_information(self, name: str) -> Dict:
         """Query the snap server for information about single snap."""
         return self._request("GET", "find", {"name": name})[0]
@@ -674,6 +1517,173 @@ class SnapClient:
         """Query the snap server for apps belonging to a named, currently installed snap."""
         return self._request("GET", "apps", {"names": name, "select": "service"})
 
+    def get_snap_conf(self, name: str, keys: Optional[List[str]] = None) -> Dict:
+        """Query the snap server for the configuration of an installed snap.
+
+        Args:
+            name: the name of the snap
+            keys: (optional) the configuration keys to read, otherwise the whole tree
+        """
+        query = {"keys": ",".join(keys)} if keys else None
+        return self._request("GET", "snaps/{}/conf".format(name), query)
+
+    def put_snap_conf(self, name: str, conf: Dict) -> str:
+        """Ask the snap server to set configuration values on an installed snap.
+
+        Args:
+            name: the name of the snap
+            conf: a dict of (possibly dotted) keys to values. A `None` value unsets the key.
+
+        Returns:
+            The ID of the started change.
+        """
+        return self._request_async("PUT", "snaps/{}/conf".format(name), body=conf)
+
+    def stream_logs(
+        self, names: List[str], num_lines: Optional[int] = None, follow: bool = False
+    ) -> Iterator[Dict]:
+        """Stream log records of snap services from the snap server.
+
+        Args:
+            names: the snaps or snap apps to get logs for, e.g. `["kafka.kafka"]`
+            num_lines: (optional) the number of past records to start with; snapd's default is 10
+            follow: keep the stream open and yield new records as they are logged
+        """
+        query = {"names": ",".join(names)}
+        if num_lines is not None:
+            query["n"] = num_lines
+        if follow:
+            query["follow"] = "true"
+        return self._request_stream("logs", query, follow=follow)
+
+    def create_cohorts(self, names: List[str]) -> Dict[str, str]:
+        """Ask the snap server to create a cohort for each of the given snaps.
+
+        Units refreshing with the same cohort key get the same revision, even while the channel
+        is being updated or progressively released.
+
+        Returns:
+            A dict of snap name to cohort key
+        """
+        return self._request("POST", "cohorts", body={"action": "create", "snaps": names})
+
+    def install_snaps(self, names: List[str]) -> str:
+        """Ask the snap server to install several snaps in a single change.
+
+        Snapd does not accept per-snap options such as a channel for multi-snap operations.
+
+        Returns:
+            The ID of the started change.
+        """
+        return self._request_async("POST", "snaps", body={"action": "install", "snaps": names})
+
+    def snap_action(self, name: str, action: str, options: Optional[Dict] = None) -> str:
+        """Ask the snap server to perform an action (install, refresh, remove...) on a snap.
+
+        Args:
+            name: the name of the snap
+            action: the action to perform
+            options: (optional) action options, e.g. `{"channel": "edge", "classic": True}`
+
+        Returns:
+            The ID of the started change.
+        """
+        body = {"action": action, **(options or {})}
+        return self._request_async("POST", "snaps/{}".format(name), body=body)
+
+    def get_change(self, change_id: str) -> Dict:
+        """Query the snap server for the status of a change.
+
+        The process-wide snap cache is invalidated once a change started by this process is ready.
+        """
+        change = self._request("GET", "changes/{}".format(change_id))
+        if change.get("ready"):
+            _Cache.complete_change(change_id)
+        return change
+
+    def app_action(self, names: List[str], action: str, options: Optional[Dict] = None) -> str:
+        """Ask the snap server to start, stop or restart snap apps.
+
+        Args:
+            names: the names of the snaps or snap apps, e.g. `["kafka.kafka"]`
+            action: the action to perform
+            options: (optional) action options, e.g. `{"enable": True}`
+
+        Returns:
+            The ID of the started change.
+        """
+        body = {"action": action, "names": names, **(options or {})}
+        return self._request_async("POST", "apps", body=body)
+
+    def wait_change(self, change_id: str, timeout: float = 600) -> Dict:
+        """Wait for a change to be ready.
+
+        Args:
+            change_id: the ID of the change to wait for
+            timeout: the maximum time to wait, in seconds. Default is 600s.
+
+        Raises:
+            SnapError if the change failed or did not finish before the timeout
+        """
+        return self.wait_changes([change_id], timeout=timeout)[change_id]
+
+    def wait_changes(
+        self,
+        change_ids: List[str],
+        timeout: float = 600,
+        min_interval: float = 0.1,
+        max_interval: float = 2.0,
+    ) -> Dict[str, Dict]:
+        """Wait for several in-flight changes to be ready.
+
+        Every pending change is polled once per round, and the delay between rounds doubles from
+        `min_interval` up to `max_interval`, so short changes return quickly while long ones do not
+        flood snapd with queries.
+
+        Args:
+            change_ids: the IDs of the changes to wait for
+            timeout: the maximum time to wait for all changes, in seconds. Default is 600s.
+            min_interval: the initial delay between two polling rounds, in seconds
+            max_interval: the maximum delay between two polling rounds, in seconds
+
+        Returns:
+            A dict of change ID to the final change status
+
+        Raises:
+            SnapError if any change failed or did not finish before the timeout
+        """
+        deadline = time.monotonic() + timeout
+        interval = min_interval
+        pending = list(dict.fromkeys(change_ids))
+        changes = {}
+
+        while True:
+            for change_id in list(pending):
+                change = self.get_change(change_id)
+                if change.get("ready"):
+                    changes[change_id] = change
+                    pending.remove(change_id)
+
+            if not pending:
+                break
+            if time.monotonic() + interval > deadline:
+                raise SnapError(
+                    "Timed out waiting for snapd change(s) {}".format(", ".join(pending))
+                )
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+
+        failed = [
+            "{} ({}): {}".format(
+                change_id, change.get("summary", ""), change.get("err", change.get("status"))
+            )
+            for change_id, change in changes.items()
+            if change.get("status") != "Done"
+        ]
+        if failed:
+            raise SnapError("Snapd change(s) failed: {}".format("; ".join(failed)))
+        return changes
+
 
 class SnapCache(Mapping):
     """An abstraction to represent installed/available packages.
@@ -682,20 +1692,37 @@ class SnapCache(Mapping):
     snaps using the `snapd` HTTP API, and a list of available snaps by reading
     the filesystem to populate the cache. Information about available snaps is lazily-loaded
     from the `snapd` API when requested.
+
+    With `lazy=True`, nothing is loaded when instantiated. Snaps are fetched one at a time from
+    the `snapd` API when requested, and the list of available snaps is searched on disk on demand
+    instead of being read entirely. Iterating over a lazy cache only yields the snaps requested so
+    far.
     """
 
-    def __init__(self):
+    def __init__(self, lazy: bool = False):
         if not self.snapd_installed:
             raise SnapError("snapd is not installed or not in /usr/bin") from None
         self._snap_client = SnapClient()
         self._snap_map = {}
-        if self.snapd_installed:
+        self._lazy = lazy
+        if self.snapd_installed and not lazy:
             self._load_available_snaps()
             self._load_installed_snaps()
 
     def __contains__(self, key: str) -> bool:
         """Magic method to ease checking if a given snap is in the cache."""
-        return key in self._snap_map
+        if key in self._snap_map:
+            return True
+        if not self._lazy:
+            return False
+        if self._catalog_contains(key):
+            return True
+
+        try:
+            self._snap_map[key] = self._load_installed(key)
+        except SnapAPIError:
+            return False
+        return True
 
     def __len__(self) -> int:
         """Returns number of items in the snap cache."""
@@ -708,6 +1735,12 @@ class SnapCache(Mapping):
     def __getitem__(self, snap_name: str) -> Snap:
         """Return either the installed version or latest version for a given snap."""
         snap = self._snap_map.get(snap_name, None)
+        if snap is None and self._lazy:
+            try:
+                snap = self._snap_map[snap_name] = self._load_installed(snap_name)
+            except SnapAPIError:
+                logger.debug("Snap '{}' is not installed".format(snap_name))
+
         if snap is None:
             # The snapd cache file may not have existed when _snap_map was
             # populated.  This is normal.
@@ -739,6 +1772,35 @@ class SnapCache(Mapping):
                 if line.strip():
                     self._snap_map[line.strip()] = None
 
+    @staticmethod
+    def _catalog_contains(name: str) -> bool:
+        """Search the list of available snaps on disk for a name, without reading all of it."""
+        try:
+            with open("/var/cache/snapd/names", "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as names:
+                    needle = name.encode("utf-8") + b"\n"
+                    return names[: len(needle)] == needle or names.find(b"\n" + needle) != -1
+        except (OSError, ValueError):
+            # The catalog may not exist yet, or be empty, which mmap refuses.
+            return False
+
+    def _load_installed(self, name: str) -> Snap:
+        """Load a single installed snap.
+
+        Args:
+            name: a string representing the name of the snap
+        """
+        i = self._snap_client.get_installed_snap(name)
+
+        return Snap(
+            name=i["name"],
+            state=SnapState.Latest,
+            channel=i["channel"],
+            revision=i["revision"],
+            confinement=i["confinement"],
+            apps=i.get("apps", None),
+        )
+
     def _load_installed_snaps(self) -> None:
         """Load the installed snaps into the dict."""
         installed = self._snap_client.get_installed_snaps()
@@ -772,6 +1834,29 @@ class SnapCache(Mapping):
         )
 
 
+def get_cache(ttl: Optional[float] = None) -> SnapCache:
+    """Get the process-wide, lazily-loaded `SnapCache`.
+
+    The cache is rebuilt when it is older than `ttl` seconds, or after a snap operation made by
+    this process, so that repeated lookups only query snapd once per snap.
+
+    Args:
+        ttl: an (Optional) maximum age of the cache in seconds. Defaults to `_Cache.ttl`, 60s.
+    """
+    expired = _Cache.expired
+    if ttl is not None and _Cache.cache is not None:
+        expired = expired or time.monotonic() - _Cache._loaded_at > ttl
+
+    if expired:
+        _Cache.cache = SnapCache(lazy=True)
+    return _Cache.cache
+
+
+def invalidate_cache() -> None:
+    """Drop the process-wide `SnapCache`, so that it is rebuilt on next use."""
+    _Cache.cache = None
+
+
 @_cache_init
 def add(
     snap_names: Union[str, List[str]],
@@ -846,6 +1931,58 @@ def ensure(
         return remove(snap_names)
 
 
+def add_many(
+    snap_names: List[str],
+    channel: Optional[str] = "",
+    classic: Optional[bool] = False,
+    cohort: Optional[str] = "",
+    timeout: float = 600,
+) -> List[Snap]:
+    """Install several snaps at once through asynchronous snapd changes.
+
+    Without options, all snaps are installed by a single multi-snap change. Snapd does not accept
+    a channel, classic confinement or a cohort for multi-snap changes, so when one of them is set
+    a change is started for each snap, and all changes run concurrently.
+
+    Args:
+        snap_names: the names of the snaps to install
+        channel: an (Optional) channel as a string
+        classic: an (Optional) boolean specifying whether it should be added with classic
+            confinement. Default `False`
+        cohort: an (Optional) key of a cohort the snaps should belong to
+        timeout: the maximum time to wait for the changes, in seconds. Default is 600s.
+
+    Raises:
+        SnapError if some snaps failed to install or were not found.
+    """
+    if not snap_names:
+        raise TypeError("Expected at least one snap to add, received zero!")
+
+    client = SnapClient()
+    options = {}
+    if channel:
+        options["channel"] = channel
+    if classic:
+        options["classic"] = True
+    if cohort:
+        options["cohort-key"] = cohort
+
+    try:
+        if options:
+            change_ids = [client.snap_action(s, "install", options) for s in snap_names]
+        else:
+            change_ids = [client.install_snaps(snap_names)]
+
+        client.wait_changes(change_ids, timeout=timeout)
+    except SnapAPIError as e:
+        raise SnapError(
+            "Failed to install snap(s) {}: {}".format(", ".join(snap_names), e.message)
+        ) from None
+
+    cache = get_cache()
+    return [cache[s] for s in snap_names]
+
+
 def _wrap_snap_operations(
     snap_names: List[str],
     state: SnapState,
@@ -860,7 +1997,7 @@ def _wrap_snap_operations(
 
     for s in snap_names:
         try:
-            snap = _Cache[s]
+            snap = get_cache()[s]
             if state is SnapState.Absent:
                 snap.ensure(state=SnapState.Absent)
             else:
@@ -907,9 +2044,9 @@ def install_local(
         result = subprocess.check_output(_cmd, universal_newlines=True).splitlines()[0]
         snap_name, _ = result.split(" ", 1)
 
-        c = SnapCache()
+        invalidate_cache()
 
-        return c[snap_name]
+        return get_cache()[snap_name]
     except CalledProcessError as e:
         raise SnapError("Could not install snap {}: {}".format(filename, e.output))
 
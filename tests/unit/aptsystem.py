@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Synthetic dpkg database, apt package lists and sources, with fake apt binaries on PATH."""
+
+import json
+import os
+import random
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+# Answers `dpkg`, `apt-get` and `apt-cache` from the files written by `FakeAptSystem`, logging
+# every invocation so that tests can count the forks made by the apt library.
+_FAKE_BINARY = """\
+#!{python}
+import json
+import os
+import sys
+
+ROOT = {root!r}
+command, args = os.path.basename(sys.argv[0]), sys.argv[1:]
+with open(os.path.join(ROOT, "calls.log"), "a") as log:
+    log.write(json.dumps([command, *args]) + "\\n")
+
+
+def stanzas(path):
+    with open(path) as f:
+        for stanza in f.read().split("\\n\\n"):
+            fields = dict(
+                line.split(": ", 1) for line in stanza.splitlines() if line[:1] not in " #"
+            )
+            if fields:
+                yield stanza, fields
+
+
+if command == "dpkg" and args == ["--print-architecture"]:
+    print({arch!r})
+elif command == "dpkg" and args == ["--print-foreign-architectures"]:
+    with open(os.path.join(ROOT, "dpkg", "arch")) as f:
+        print("".join(f.read().splitlines(True)[1:]), end="")
+elif command == "dpkg" and args[0] == "-l":
+    found = [
+        fields
+        for _, fields in stanzas(os.path.join(ROOT, "dpkg", "status"))
+        if fields["Package"] == args[1]
+    ]
+    if not found:
+        sys.exit("dpkg-query: no packages found matching " + args[1])
+    print("Desired=Unknown/Install/Remove/Purge/Hold")
+    print("| Status=Not/Inst/Conf-files/Unpacked/halF-conf/Half-inst/trig-aWait/Trig-pend")
+    print("|/ Err?=(none)/Reinst-required (Status,Err: uppercase=bad)")
+    print("||/ Name  Version  Architecture  Description")
+    print("+++-=====-========-=============-===========")
+    for fields in found:
+        state = "ii" if fields["Status"].endswith(" installed") else "rc"
+        print(
+            "{{}}  {{}}:{{}}  {{}}  {{}}  {{}}".format(
+                state,
+                fields["Package"],
+                fields["Architecture"],
+                fields["Version"],
+                fields["Architecture"],
+                fields["Description"],
+            )
+        )
+elif command == "apt-cache" and args[0] == "show":
+    lists = os.path.join(ROOT, "lists")
+    found = [
+        stanza
+        for name in sorted(os.listdir(lists))
+        if name.endswith("_Packages")
+        for stanza, fields in stanzas(os.path.join(lists, name))
+        if fields["Package"] == args[1]
+    ]
+    if not found:
+        sys.exit("E: No packages found")
+    print("\\n\\n".join(found))
+elif command == "apt-get" and "install" in args:
+    if any(arg.startswith("broken") for arg in args[args.index("install") + 1 :]):
+        sys.exit(100)
+"""
+
+_PREFIXES = ("lib", "python3-", "golang-", "node-", "fonts-", "")
+_SECTIONS = ("libs", "python", "golang", "javascript", "fonts", "utils")
+_DESCRIPTION = """\
+Description: {name} synthetic package
+ This package was generated to give the apt library a dpkg database and package
+ lists of a realistic size.
+ .
+ It has no contents.
+"""
+
+
+class FakeAptSystem:
+    """Fake Debian system holding the files read by the apt library, in a temporary directory.
+
+    `populate` writes a dpkg status database with the given number of installed packages, apt
+    package lists with the given number of available packages, and sources files. Fake `dpkg`,
+    `apt-get` and `apt-cache` binaries in `bin_dir` answer from the same files and log their
+    invocations, which `calls` returns.
+    """
+
+    def __init__(self, root: Path, arch: str = "amd64"):
+        self.root = root
+        self.arch = arch
+        self.status_path = root / "dpkg" / "status"
+        self.arch_path = root / "dpkg" / "arch"
+        self.lists_dir = root / "lists"
+        self.index_cache_path = root / "cache" / "packages-index.json"
+        self.update_stamp_path = root / "cache" / "update-stamp.json"
+        self.sources_list_path = root / "sources.list"
+        self.sources_parts_dir = root / "sources.list.d"
+        self.keyrings_dir = root / "keyrings"
+        self.bin_dir = root / "bin"
+        self.installed: List[str] = []
+        self.available: List[str] = []
+
+        for directory in (
+            self.status_path.parent,
+            self.lists_dir,
+            self.sources_parts_dir,
+            self.keyrings_dir,
+            self.bin_dir,
+        ):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.status_path.write_text("")
+        self.arch_path.write_text("{}\n".format(arch))
+
+        binary = _FAKE_BINARY.format(python=sys.executable, root=str(root), arch=arch)
+        for command in ("dpkg", "apt-get", "apt-cache"):
+            path = self.bin_dir / command
+            path.write_text(binary)
+            path.chmod(0o755)
+
+    # -- fixtures --
+
+    @staticmethod
+    def package_name(index: int) -> str:
+        """Name of the nth synthetic package."""
+        return "{}pkg{:05d}".format(_PREFIXES[index % len(_PREFIXES)], index)
+
+    @staticmethod
+    def package_version(rng: random.Random) -> str:
+        """A random version, using epochs, tildes and Debian revisions like the archive does."""
+        version = "{}.{}.{}".format(rng.randint(0, 9), rng.randint(0, 30), rng.randint(0, 99))
+        if rng.random() < 0.1:
+            version = "{}:{}".format(rng.randint(1, 3), version)
+        if rng.random() < 0.1:
+            version += "~rc{}".format(rng.randint(1, 5))
+        if rng.random() < 0.2:
+            version += "+dfsg"
+        return "{}-{}ubuntu{}".format(version, rng.randint(1, 5), rng.randint(0, 3))
+
+    def _stanza(self, index: int, version: str, arch: str, **fields) -> str:
+        name = self.package_name(index)
+        lines = [
+            "Package: {}".format(name),
+            *("{}: {}".format(k.replace("_", "-"), v) for k, v in fields.items()),
+            "Priority: optional",
+            "Section: {}".format(_SECTIONS[index % len(_SECTIONS)]),
+            "Installed-Size: {}".format(index % 4096 + 16),
+            "Maintainer: Synthetic Maintainers <synthetic@example.com>",
+            "Architecture: {}".format(arch),
+            "Version: {}".format(version),
+            "Depends: libc6 (>= 2.34), {}".format(self.package_name(index // 2)),
+        ]
+        return "\n".join(lines) + "\n" + _DESCRIPTION.format(name=name)
+
+    def populate(
+        self,
+        installed: int = 50,
+        available: int = 500,
+        sources: int = 10,
+        updates: float = 0.1,
+        seed: int = 0,
+    ) -> None:
+        """Write the dpkg database, package lists and sources.
+
+        The first `installed` of the `available` packages are installed, and a fraction
+        `updates` of the available packages also have a newer version in an updates pocket.
+        """
+        rng = random.Random(seed)
+        versions = [self.package_version(rng) for _ in range(available)]
+        archs = [self.arch if i % 5 else "all" for i in range(available)]
+        self.available = [self.package_name(i) for i in range(available)]
+        self.installed = self.available[:installed]
+
+        status = [
+            self._stanza(i, versions[i], archs[i], Status="install ok installed")
+            for i in range(installed)
+        ]
+        status.append(
+            "Package: dpkg\nStatus: install ok installed\n"
+            "Architecture: {}\nVersion: 1.21.1ubuntu2\n".format(self.arch)
+        )
+        self.status_path.write_text("\n".join(status))
+
+        pockets = {"main": [], "universe": [], "updates": []}
+        for i in range(available):
+            filename = "Filename: pool/{}.deb".format(self.available[i])
+            pocket = "main" if i % 3 else "universe"
+            pockets[pocket].append(self._stanza(i, versions[i], archs[i], Filename=filename))
+            if rng.random() < updates:
+                update = "{}+0.1".format(versions[i])
+                pockets["updates"].append(self._stanza(i, update, archs[i], Filename=filename))
+        for pocket, stanzas in pockets.items():
+            suite = "jammy-updates" if pocket == "updates" else "jammy"
+            component = "universe" if pocket == "universe" else "main"
+            name = "archive.ubuntu.com_ubuntu_dists_{}_{}_binary-{}_Packages".format(
+                suite, component, self.arch
+            )
+            (self.lists_dir / name).write_text("\n".join(stanzas))
+
+        self.sources_list_path.write_text(
+            "# See sources.list(5)\n"
+            "deb http://archive.ubuntu.com/ubuntu jammy main restricted universe\n"
+            "deb http://archive.ubuntu.com/ubuntu jammy-updates main restricted universe\n"
+        )
+        for i in range(sources):
+            uri = "http://ppa.example.com/team{}/ubuntu".format(i)
+            if i % 2:
+                (self.sources_parts_dir / "team{}.sources".format(i)).write_text(
+                    "Types: deb deb-src\nURIs: {0}\nSuites: jammy jammy-updates\n"
+                    "Components: main\nSigned-By: {1}/team{2}.gpg\n\n"
+                    "Types: deb\nURIs: {0}\nSuites: jammy-proposed\nComponents: main\n"
+                    "Signed-By: {1}/team{2}.gpg\nEnabled: no\n".format(uri, self.keyrings_dir, i)
+                )
+            else:
+                (self.sources_parts_dir / "team{}.list".format(i)).write_text(
+                    "# PPA for team {1}\n"
+                    "deb [arch={2}] {0} jammy main\n"
+                    "# deb-src {0} jammy main\n".format(uri, i, self.arch)
+                )
+
+    def calls(self, command: Optional[str] = None) -> List[List[str]]:
+        """The invocations of the fake binaries, optionally only those of one command."""
+        log = self.root / "calls.log"
+        if not log.exists():
+            return []
+        calls = [json.loads(line) for line in log.read_text().splitlines()]
+        return [c for c in calls if command is None or c[0] == command]
+
+    def reset_calls(self) -> None:
+        """Forget the invocations logged so far."""
+        (self.root / "calls.log").unlink(missing_ok=True)
+
+    @property
+    def path(self) -> str:
+        """A PATH on which the fake binaries come first."""
+        return os.pathsep.join([str(self.bin_dir), os.environ.get("PATH", "")])
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""The pytest fixtures running the snap and apt libraries against fake systems."""
+
+import pytest
+from charms.kafka.v0 import kafka_snap
+from charms.operator_libs_linux.v0 import apt
+from charms.operator_libs_linux.v1 import snap
+from tests.unit.aptsystem import FakeAptSystem
+from tests.unit.snapd import FakeSnapd
+
+
+@pytest.fixture(autouse=True)
+def apt_state_paths(monkeypatch, tmp_path):
+    """Keep the files written by the apt library, and the ones it snapshots, out of the host."""
+    state = tmp_path / "apt-state"
+    monkeypatch.setattr(apt, "APT_UPDATE_STAMP_PATH", str(state / "update-stamp.json"))
+    monkeypatch.setattr(apt, "PACKAGE_INDEX_CACHE_PATH", str(state / "packages-index.json"))
+    monkeypatch.setattr(apt, "APT_SOURCES_LIST_PATH", str(state / "sources.list"))
+    monkeypatch.setattr(apt, "APT_SOURCES_PARTS_PATH", str(state / "sources.list.d"))
+    monkeypatch.setattr(apt, "APT_KEYRINGS_PATTERNS", (str(state / "keyrings" / "*"),))
+
+
+@pytest.fixture()
+def snapd(monkeypatch, tmp_path):
+    """A fake snapd, used by default by every `SnapClient`."""
+    snap_bin = tmp_path / "snap"
+    snap_bin.touch()
+    monkeypatch.setattr(kafka_snap, "SNAPD_BIN", str(snap_bin))
+    monkeypatch.setattr(snap.SnapCache, "snapd_installed", True)
+
+    with FakeSnapd() as fake:
+        monkeypatch.setattr(snap, "SNAPD_SOCKET_PATH", fake.socket_path)
+        snap.invalidate_cache()
+        yield fake
+        snap.invalidate_cache()
+        snap._get_connection_pool(fake.socket_path).close()
+
+
+@pytest.fixture()
+def apt_system(monkeypatch, tmp_path):
+    """A fake Debian system, read by the apt library instead of the real one."""
+    fake = FakeAptSystem(tmp_path / "apt")
+    monkeypatch.setenv("PATH", fake.path)
+    for name, value in {
+        "DPKG_STATUS_PATH": fake.status_path,
+        "DPKG_ARCH_PATH": fake.arch_path,
+        "APT_LISTS_PATH": fake.lists_dir,
+        "PACKAGE_INDEX_CACHE_PATH": fake.index_cache_path,
+        "APT_UPDATE_STAMP_PATH": fake.update_stamp_path,
+        "APT_SOURCES_LIST_PATH": fake.sources_list_path,
+        "APT_SOURCES_PARTS_PATH": fake.sources_parts_dir,
+    }.items():
+        monkeypatch.setattr(apt, name, str(value))
+    monkeypatch.setattr(apt, "APT_KEYRINGS_PATTERNS", (str(fake.keyrings_dir / "*"),))
+    for name in ("_dpkg_status", "_package_lists", "_system_architecture"):
+        monkeypatch.setattr(apt, name, None)
+    monkeypatch.setattr(apt, "_foreign_architectures", None)
+    monkeypatch.setattr(apt, "_sources_cache", {})
+    return fake
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""In-process fake of the snapd REST API, served over a temporary Unix socket."""
+
+import json
+import logging
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class _SnapdHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_SnapdServer"
+
+    def setup(self):
+        super().setup()
+        self.server.snapd.connections += 1
+
+    def address_string(self) -> str:
+        return "snapd.socket"
+
+    def log_message(self, format, *args) -> None:
+        logger.debug(format, *args)
+
+    def _send(self, code: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"null") if length else None
+
+        snapd = self.server.snapd
+        snapd.requests.append((method, url.path, query, body))
+        if snapd.latency:
+            time.sleep(snapd.latency)
+
+        path = url.path.removeprefix("/v2/").strip("/").split("/")
+        try:
+            code, payload = snapd.handle(method, path, query, body)
+        except KeyError as e:
+            code, payload = 404, FakeSnapd.error(404, "not found: {}".format(e))
+
+        if payload is None:
+            snapd.stream_logs(self, query)
+        else:
+            self._send(code, payload)
+        # hang up without a "Connection: close" header, like snapd timing out an idle client
+        self.close_connection = self.close_connection or snapd.close_idle
+
+    def do_GET(self):  # noqa: N802
+        self._dispatch("GET")
+
+    def do_POST(self):  # noqa: N802
+        self._dispatch("POST")
+
+    def do_PUT(self):  # noqa: N802
+        self._dispatch("PUT")
+
+
+class _SnapdServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    snapd: "FakeSnapd"
+
+    def shutdown_request(self, request):
+        super().shutdown_request(request)
+        self.snapd.disconnections += 1
+
+
+class FakeSnapd:
+    """Fake snapd daemon implementing the subset of the REST API used by the snap library.
+
+    Snaps, their apps, config and the store catalog are held in memory. Every change completes
+    after being polled `change_polls` times, and every request is delayed by `latency` seconds.
+    With `close_idle` set, every connection is closed after one response, without telling the
+    client beforehand.
+    """
+
+    def __init__(self, latency: float = 0.0, change_polls: int = 0):
+        self.latency = latency
+        self.change_polls = change_polls
+        self.installed: Dict[str, Dict] = {}
+        self.store: Dict[str, Dict] = {}
+        self.config: Dict[str, Dict] = {}
+        self.logs: List[Dict] = []
+        self.changes: Dict[str, Dict] = {}
+        self.failing: List[str] = []
+        self.requests: List[tuple] = []
+        self.connections = 0
+        self.disconnections = 0
+        self.close_idle = False
+
+        self._dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self._dir.name, "snapd.socket")
+        self._server = _SnapdServer(self.socket_path, _SnapdHandler)
+        self._server.snapd = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    def __enter__(self) -> "FakeSnapd":
+        """Start serving requests in a background thread."""
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Stop the server and remove its socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._dir.cleanup()
+
+    # -- fixtures --
+
+    def add_store_snap(
+        self, name: str, channel: str = "latest/stable", revision: str = "1", apps=None
+    ) -> None:
+        """Make a snap available in the fake store."""
+        self.store[name] = {
+            "name": name,
+            "channel": channel,
+            "revision": revision,
+            "confinement": "strict",
+            "apps": apps or [],
+        }
+
+    def add_installed_snap(
+        self, name: str, channel: str = "latest/stable", revision: str = "1", services=()
+    ) -> None:
+        """Install a snap, with the given daemons active."""
+        apps = [
+            {"snap": name, "name": service, "daemon": "simple", "enabled": True, "active": True}
+            for service in services
+        ]
+        self.add_store_snap(name, channel, revision, apps)
+        self.installed[name] = dict(self.store[name])
+        self.installed[name]["tracking-channel"] = channel
+
+    def requests_to(self, method: str, path: str) -> int:
+        """Count the requests made to an endpoint."""
+        return sum(1 for r in self.requests if r[0] == method and r[1] == "/v2/" + path)
+
+    # -- API --
+
+    @staticmethod
+    def sync(result) -> Dict:
+        return {"type": "sync", "status-code": 200, "status": "OK", "result": result}
+
+    @staticmethod
+    def error(code: int, message: str) -> Dict:
+        return {"type": "error", "status-code": code, "result": {"message": message}}
+
+    def _change(self, kind: str, apply) -> tuple:
+        change_id = str(len(self.changes) + 1)
+        self.changes[change_id] = {
+            "id": change_id,
+            "kind": kind,
+            "summary": kind,
+            "polls": 0,
+            "apply": apply,
+        }
+        return 202, {"type": "async", "status-code": 202, "result": None, "change": change_id}
+
+    def _get_change(self, change_id: str) -> Dict:
+        change = self.changes[change_id]
+        ready = change["polls"] >= self.change_polls
+        change["polls"] += 1
+        result = {"id": change_id, "kind": change["kind"], "summary": change["summary"]}
+
+        if not ready:
+            return dict(result, status="Doing", ready=False)
+        if change["apply"] is not None:
+            change["error"] = change["apply"]()
+            change["apply"] = None
+        if change.get("error"):
+            return dict(result, status="Error", ready=True, err=change["error"])
+        return dict(result, status="Done", ready=True)
+
+    def _install(self, name: str, options: Dict) -> Optional[str]:
+        if name in self.failing or name not in self.store:
+            return "cannot install {!r}".format(name)
+        channel = options.get("channel") or self.store[name]["channel"]
+        self.installed[name] = dict(self.store[name], channel=channel)
+        self.installed[name]["tracking-channel"] = channel
+
+    def _install_many(self, names: List[str]) -> Optional[str]:
+        errors = [self._install(name, {}) for name in names]
+        return "; ".join(e for e in errors if e)
+
+    def _remove(self, name: str) -> None:
+        self.installed.pop(name, None)
+
+    def _snap_action(self, name: str, body: Dict) -> tuple:
+        action = body["action"]
+        if action in ("install", "refresh"):
+            return self._change(action, lambda: self._install(name, body))
+        if action == "remove":
+            return self._change(action, lambda: self._remove(name))
+        return 400, self.error(400, "unknown action {!r}".format(action))
+
+    def _app_action(self, body: Dict) -> tuple:
+        def apply():
+            active = body["action"] in ("start", "restart")
+            for name in body["names"]:
+                snap, _, service = name.partition(".")
+                for app in self.installed[snap]["apps"]:
+                    if not service or app["name"] == service:
+                        app["active"] = active
+
+        return self._change(body["action"], apply)
+
+    def _set_config(self, name: str, body: Dict) -> tuple:
+        def apply():
+            for key, value in body.items():
+                *parents, leaf = key.split(".")
+                node = self.config.setdefault(name, {})
+                for parent in parents:
+                    node = node.setdefault(parent, {})
+                if value is None:
+                    node.pop(leaf, None)
+                else:
+                    node[leaf] = value
+
+        return self._change("configure-snap", apply)
+
+    def _snaps(self, method: str, args: List[str], query: Dict, body: Optional[Dict]) -> tuple:
+        if not args:
+            if method == "POST":
+                return self._change("install", lambda: self._install_many(body["snaps"]))
+            return 200, self.sync(list(self.installed.values()))
+
+        name = args[0]
+        if args[1:] == ["conf"]:
+            if method == "PUT":
+                return self._set_config(name, body)
+            return 200, self.sync(self.config.get(name, {}))
+
+        if method == "POST":
+            return self._snap_action(name, body)
+        if name not in self.installed:
+            return 404, self.error(404, "snap not installed")
+        return 200, self.sync(self.installed[name])
+
+    def _find(self, method: str, args: List[str], query: Dict, body: Optional[Dict]) -> tuple:
+        if query["name"] not in self.store:
+            return 404, self.error(404, "snap not found")
+        return 200, self.sync([self.store[query["name"]]])
+
+    def _apps(self, method: str, args: List[str], query: Dict, body: Optional[Dict]) -> tuple:
+        if method == "POST":
+            return self._app_action(body)
+        apps = self.installed[query["names"]]["apps"]
+        return 200, self.sync([app for app in apps if "daemon" in app])
+
+    def _changes(self, method: str, args: List[str], query: Dict, body: Optional[Dict]) -> tuple:
+        return 200, self.sync(self._get_change(args[0]))
+
+    def _cohorts(self, method: str, args: List[str], query: Dict, body: Optional[Dict]) -> tuple:
+        return 200, self.sync({name: "cohort-{}".format(name) for name in body["snaps"]})
+
+    def _logs(self, method: str, args: List[str], query: Dict, body: Optional[Dict]) -> tuple:
+        return 200, None
+
+    def handle(self, method: str, path: List[str], query: Dict, body: Optional[Dict]) -> tuple:
+        """Answer a request, returning the status code and JSON payload.
+
+        A `None` payload means the response is a stream of log records.
+        """
+        handlers = {
+            "snaps": self._snaps,
+            "find": self._find,
+            "apps": self._apps,
+            "changes": self._changes,
+            "logs": self._logs,
+            "cohorts": self._cohorts,
+        }
+        if path[0] not in handlers:
+            return 404, self.error(404, "unknown endpoint")
+        return handlers[path[0]](method, path[1:], query, body)
+
+    def stream_logs(self, handler: _SnapdHandler, query: Dict) -> None:
+        """Send the log records matching the query as a chunked application/json-seq stream."""
+        names = query.get("names", "").split(",")
+        records = [r for r in self.logs if r["sid"] in names or r["sid"].split(".")[0] in names]
+        records = records[-int(query.get("n", 10)) :]
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json-seq")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        for record in records:
+            chunk = b"\x1e" + json.dumps(record).encode() + b"\n"
+            handler.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        handler.wfile.write(b"0\r\n\r\n")
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import random
+
+import pytest
+from charms.operator_libs_linux.v0 import apt
+
+DPKG_STATUS = """\
+Package: vim
+Status: install ok installed
+Architecture: amd64
+Version: 2:9.0.1378-2
+Description: Vi IMproved
+ multi-line
+ Package: not-a-field
+
+Package: nano
+Status: deinstall ok config-files
+Architecture: amd64
+Version: 7.2-1
+
+Package: tzdata
+Status: install ok installed
+Architecture: all
+Version: 2024a-0+deb12u1
+"""
+
+
+@pytest.fixture()
+def dpkg_status(monkeypatch, tmp_path):
+    status = tmp_path / "status"
+    status.write_text(DPKG_STATUS)
+    monkeypatch.setattr(apt, "DPKG_STATUS_PATH", str(status))
+    monkeypatch.setattr(apt, "_system_architecture", "amd64")
+    monkeypatch.setattr(apt, "_dpkg_status", None)
+    return status
+
+
+def test_installed_package_from_dpkg_status(dpkg_status):
+    vim = apt.DebianPackage.from_installed_package("vim")
+
+    assert vim.present
+    assert (vim.epoch, vim.version.number, vim.arch) == ("2", "9.0.1378-2", "amd64")
+    assert apt.DebianPackage.from_installed_package("tzdata").arch == "all"
+    for package in ("nano", "not-a-field", "vim:arm64"):
+        with pytest.raises(apt.PackageNotFoundError):
+            apt.DebianPackage.from_installed_package(package)
+
+
+def test_dpkg_status_reloaded_when_replaced(dpkg_status):
+    status = apt._get_dpkg_status()
+    assert apt._get_dpkg_status() is status
+
+    replacement = dpkg_status.with_name("status-new")
+    replacement.write_text(DPKG_STATUS.replace("config-files", "installed"))
+    replacement.replace(dpkg_status)
+
+    assert apt._get_dpkg_status() is not status
+    assert apt.DebianPackage.from_installed_package("nano").version.number == "7.2-1"
+
+
+def test_architectures_detected_without_forks(dpkg_status, monkeypatch, tmp_path):
+    dpkg_status.write_text(
+        DPKG_STATUS + "\nPackage: dpkg\nStatus: install ok installed\nArchitecture: arm64\n"
+    )
+    monkeypatch.setattr(apt, "_system_architecture", None)
+    monkeypatch.setattr(apt, "_foreign_architectures", None)
+    monkeypatch.setattr(apt, "DPKG_ARCH_PATH", str(tmp_path / "arch"))
+    monkeypatch.setattr(apt, "check_output", None)
+
+    assert apt.get_system_architecture() == "arm64"
+    assert apt.get_foreign_architectures() == []
+
+    (tmp_path / "arch").write_text("arm64\narmhf\n")
+    assert apt.get_foreign_architectures() == ["armhf"]
+
+
+PACKAGES = """\
+Package: vim
+Architecture: amd64
+Version: 2:9.0.1378-2
+Description: Vi IMproved
+
+Package: vim
+Architecture: amd64
+Version: 2:9.1.0016-1
+Description: Vi IMproved
+
+Package: vim
+Architecture: arm64
+Version: 2:9.2-1
+"""
+
+
+@pytest.fixture()
+def package_lists(monkeypatch, tmp_path):
+    lists = tmp_path / "lists"
+    lists.mkdir()
+    (lists / "deb.debian.org_debian_dists_bookworm_main_binary-amd64_Packages").write_text(
+        PACKAGES
+    )
+    sources_list = tmp_path / "sources.list"
+    sources_list.write_text("deb http://deb.debian.org/debian bookworm main contrib\n")
+    monkeypatch.setattr(apt, "APT_SOURCES_LIST_PATH", str(sources_list))
+    monkeypatch.setattr(apt, "APT_LISTS_PATH", str(lists))
+    monkeypatch.setattr(apt, "PACKAGE_INDEX_CACHE_PATH", str(tmp_path / "cache" / "index.json"))
+    monkeypatch.setattr(apt, "_system_architecture", "amd64")
+    monkeypatch.setattr(apt, "_package_lists", None)
+    return lists
+
+
+def test_foreign_architecture_lookups(dpkg_status, package_lists, monkeypatch, tmp_path):
+    monkeypatch.setattr(apt, "DPKG_ARCH_PATH", str(tmp_path / "arch"))
+    monkeypatch.setattr(apt, "_foreign_architectures", None)
+    monkeypatch.setattr(apt, "check_output", None)
+
+    for package, arch in (("vim:arm64", ""), ("vim", "arm64")):
+        with pytest.raises(apt.PackageNotFoundError, match="arm64 is not enabled"):
+            apt.DebianPackage.from_apt_cache(package, arch=arch)
+
+    (tmp_path / "arch").write_text("amd64\narm64\n")
+    vim = apt.DebianPackage.from_apt_cache("vim:arm64")
+    assert (vim.version.number, vim.arch) == ("9.2-1", "arm64")
+    assert apt.DebianPackage.from_apt_cache("vim").arch == "amd64"
+    with pytest.raises(apt.PackageNotFoundError):
+        apt.DebianPackage.from_installed_package("vim:arm64")
+
+
+def test_apt_cache_package_from_lists(package_lists):
+    assert apt.DebianPackage.from_apt_cache("vim").version.number == "9.1.0016-1"
+    assert apt.DebianPackage.from_apt_cache("vim", version="2:9.0.1378-2").epoch == "2"
+    with pytest.raises(apt.PackageNotFoundError):
+        apt.DebianPackage.from_apt_cache("emacs")
+
+
+def test_package_index_cached_on_disk(package_lists):
+    apt.DebianPackage.from_apt_cache("vim")
+
+    lists = apt._PackageLists(apt.APT_LISTS_PATH, apt.PACKAGE_INDEX_CACHE_PATH)
+    assert all(f.indexed for f in lists._files)
+    assert apt._get_package_lists() is apt._get_package_lists()
+
+    extra = package_lists / "deb.debian.org_debian_dists_bookworm_contrib_binary-all_Packages"
+    extra.write_text("Package: emacs\nArchitecture: all\nVersion: 1\n")
+    assert apt.DebianPackage.from_apt_cache("emacs").version.number == "1"
+
+
+def test_lists_of_disabled_repositories_skipped(package_lists, monkeypatch, tmp_path):
+    parts = tmp_path / "sources.list.d"
+    parts.mkdir()
+    (parts / "kafka.list").write_text("deb http://example.com/kafka_builds bookworm main\n")
+    monkeypatch.setattr(apt, "APT_SOURCES_PARTS_PATH", str(parts))
+    (
+        package_lists / "example.com_kafka%5fbuilds_dists_bookworm_main_binary-amd64_Packages"
+    ).write_text("Package: vim\nArchitecture: amd64\nVersion: 2:9.2-1\n")
+    assert apt.DebianPackage.from_apt_cache("vim").version.number == "9.2-1"
+
+    repositories = apt.RepositoryMapping()
+    repositories.disable(repositories["deb-http://example.com/kafka_builds-bookworm"])
+    assert apt.DebianPackage.from_apt_cache("vim").version.number == "9.1.0016-1"
+    with pytest.raises(apt.PackageNotFoundError):
+        apt.DebianPackage.from_apt_cache("vim", version="2:9.2-1")
+
+
+def test_add_package_installs_in_one_transaction(dpkg_status, package_lists, monkeypatch):
+    (
+        package_lists / "deb.debian.org_debian_dists_bookworm_contrib_binary-all_Packages"
+    ).write_text(
+        "Package: htop\nArchitecture: all\nVersion: 3.2.2-2\n\n"
+        "Package: curl\nArchitecture: all\nVersion: 7.88.1-10\n\n"
+        "Package: broken\nArchitecture: all\nVersion: 1.0\n"
+    )
+    commands = []
+
+    def check_call(cmd, **kwargs):
+        commands.append(cmd[cmd.index("install") + 1 :] if "install" in cmd else cmd[-1:])
+        if "broken=1.0" in cmd:
+            raise apt.CalledProcessError(100, cmd)
+
+    monkeypatch.setattr(apt, "check_call", check_call)
+
+    vim, htop, curl = apt.add_package(["vim", "htop", "curl"])
+    assert vim.present and htop.present and curl.present
+    assert commands == [["htop=3.2.2-2", "curl=7.88.1-10"]]
+
+    commands.clear()
+    with pytest.raises(apt.PackageError, match=r"missing \(not found\), broken \(Could not"):
+        apt.add_package(["curl", "broken", "missing"])
+    assert commands == [
+        ["curl=7.88.1-10", "broken=1.0"],
+        ["curl=7.88.1-10"],
+        ["broken=1.0"],
+        ["update"],
+    ]
+
+
+def test_update_skips_fresh_cache(monkeypatch, tmp_path):
+    sources, keyrings = tmp_path / "sources.list.d", tmp_path / "keyrings"
+    sources.mkdir()
+    keyrings.mkdir()
+    (sources / "debian.sources").write_text("Types: deb\n")
+    monkeypatch.setattr(apt, "APT_UPDATE_STAMP_PATH", str(tmp_path / "stamp.json"))
+    monkeypatch.setattr(apt, "APT_SOURCES_PARTS_PATH", str(sources))
+    monkeypatch.setattr(apt, "APT_KEYRINGS_PATTERNS", (str(keyrings / "*"),))
+    commands = []
+    monkeypatch.setattr(apt, "check_call", lambda cmd, **kw: commands.append(cmd))
+
+    assert apt.update(max_age=60)
+    assert not apt.update(max_age=60)
+    assert commands == [["apt-get", "update"]]
+
+    (sources / "kafka.list").write_text("deb http://example.com focal main\n")
+    assert apt.update(max_age=60)
+    assert not apt.update(max_age=60)
+    assert "Dir::Etc::sourcelist={}".format(sources / "kafka.list") in commands[1]
+    assert len(commands) == 2
+
+    (keyrings / "kafka.gpg").write_bytes(b"")
+    assert apt.update(max_age=60)
+    assert commands[2] == ["apt-get", "update"]
+    assert apt.update(max_age=0) and apt.update()
+    assert len(commands) == 5
+
+
+def test_update_in_full_when_repositories_removed(monkeypatch, tmp_path):
+    sources = tmp_path / "sources.list.d"
+    sources.mkdir()
+    ppa, kafka = sources / "ppa.list", sources / "kafka.list"
+    ppa.write_text("deb http://ppa.example.com/ubuntu focal main\n")
+    monkeypatch.setattr(apt, "APT_SOURCES_PARTS_PATH", str(sources))
+    commands = []
+    monkeypatch.setattr(apt, "check_call", lambda cmd, **kw: commands.append(cmd))
+    assert apt.update()
+
+    kafka.write_text("deb http://example.com focal main\n")
+    assert apt.update(max_age=3600)
+    kafka.write_text(
+        "deb http://example.com focal main\ndeb http://example.com focal-updates main\n"
+    )
+    assert apt.update(max_age=3600)
+    assert "APT::Get::List-Cleanup=0" in commands[1] and "APT::Get::List-Cleanup=0" in commands[2]
+
+    kafka.write_text(
+        "# deb http://example.com focal main\ndeb http://example.com focal-updates main\n"
+    )
+    assert apt.update(max_age=3600)
+    assert commands[3] == ["apt-get", "update"]
+
+    ppa.unlink()
+    assert apt.update(max_age=3600)
+    assert commands[4] == ["apt-get", "update"]
+    assert not apt.update(max_age=3600)
+    assert len(commands) == 5
+
+
+def test_version_sort_key_orders_like_dpkg():
+    ordered = [
+        "1.0~~",
+        "1.0~~a",
+        "1.0~",
+        "1.0",
+        "1.0-1~bpo1",
+        "1.0-1",
+        "1.0a",
+        "1.0+dfsg",
+        "1.0.1",
+        "1.2",
+        "1.10",
+        "1:0.1",
+        "10:0.1",
+    ]
+    versions = [
+        apt.Version(*reversed(apt.DebianPackage._get_epoch_from_version(v))) for v in ordered
+    ]
+
+    shuffled = random.Random(0).sample(versions, len(versions))
+    assert [str(v) for v in sorted(shuffled, key=apt.Version.sort_key)] == ordered
+    assert all(a < b for a, b in zip(versions, versions[1:]))
+    assert apt.Version("1.0", "") == apt.Version("1.0-0", "")
+    assert apt.Version("01.0", "0") == apt.Version("1.0", "")
+
+
+def test_version_constraints(package_lists):
+    def version(v):
+        return apt.Version(*reversed(apt.DebianPackage._get_epoch_from_version(v)))
+
+    constraint = apt.VersionConstraint(">= 1.2, << 2.0")
+    assert constraint.matches(version("1.2")) and constraint.matches(version("1.9-3ubuntu1"))
+    assert constraint.matches(version("2.0~rc1"))
+    assert not constraint.matches(version("2.0")) and not constraint.matches(version("1.1"))
+
+    compatible = apt.VersionConstraint("~= 2.8.1")
+    assert compatible.matches(version("2.8.9-1")) and not compatible.matches(version("2.9~rc1"))
+    assert compatible.select(version(v) for v in ["2.8.0", "2.8.4", "2.9", "2.8.2"]).number == (
+        "2.8.4"
+    )
+    assert apt.VersionConstraint("(= 1:2.0)").matches(version("1:2.0-0"))
+
+    with pytest.raises(apt.InvalidVersionConstraintError):
+        apt.VersionConstraint("> 1.0")
+
+    assert apt.DebianPackage.from_apt_cache("vim", ">= 2:9.0, << 2:9.1").version.number == (
+        "9.0.1378-2"
+    )
+    with pytest.raises(apt.PackageNotFoundError):
+        apt.DebianPackage.from_apt_cache("vim", ">> 2:9.1.0016-1")
+
+
+DEBIAN_12_KEY = """\
+-----BEGIN PGP PUBLIC KEY BLOCK-----
+
+mDMEY865UxYJKwYBBAHaRw8BAQdAd7Z0srwuhlB6JKFkcf4HU4SSS/xcRfwEQWzr
+crf6AEq0SURlYmlhbiBTdGFibGUgUmVsZWFzZSBLZXkgKDEyL2Jvb2t3b3JtKSA8
+ZGViaWFuLXJlbGVhc2VAbGlzdHMuZGViaWFuLm9yZz6IlgQTFggAPhYhBE1k/sEZ
+wgKQZ9bnkfjSWFuHg9SBBQJjzrlTAhsDBQkPCZwABQsJCAcCBhUKCQgLAgQWAgMB
+Ah4BAheAAAoJEPjSWFuHg9SBSgwBAP9qpeO5z1s5m4D4z3TcqDo1wez6DNya27QW
+WoG/4oBsAQCEN8Z00DXagPHbwrvsY2t9BCsT+PgnSn9biobwX7bDDg==
+=5NZE
+-----END PGP PUBLIC KEY BLOCK-----
+"""
+
+
+def test_import_key_without_gpg(monkeypatch):
+    monkeypatch.setattr(apt.subprocess, "run", None)
+    written = {}
+    monkeypatch.setattr(
+        apt.DebianRepository,
+        "_write_apt_gpg_keyfile",
+        staticmethod(lambda key_name, key_material: written.update({key_name: key_material})),
+    )
+    repo = apt.DebianRepository(True, "deb", "http://deb.debian.org/debian", "bookworm", ["main"])
+
+    repo.import_key("Comment: Debian 12\n" + DEBIAN_12_KEY)
+
+    fingerprint = "4D64FEC119C2029067D6E791F8D2585B8783D481"
+    assert repo.gpg_key == "/etc/apt/trusted.gpg.d/{}.gpg".format(fingerprint)
+    assert apt._fingerprint(written[repo.gpg_key]) == fingerprint
+
+    with pytest.raises(apt.GPGKeyError, match="checksum"):
+        apt._dearmor(DEBIAN_12_KEY.replace("=5NZE", "=AAAA").encode())
+
+
+DEB822_SOURCES = """\
+# Debian
+Types: deb deb-src
+URIs: http://deb.debian.org/debian
+Suites: bookworm bookworm-updates
+Components: main contrib
+Signed-By: /usr/share/keyrings/debian-archive-keyring.gpg
+
+Types: deb
+URIs: http://deb.debian.org/debian-security
+Suites: bookworm-security
+Components: main
+Architectures: amd64 arm64
+"""
+
+
+@pytest.fixture()
+def sources(monkeypatch, tmp_path):
+    monkeypatch.setattr(apt, "_sources_cache", {})
+    (tmp_path / "debian.sources").write_text(DEB822_SOURCES)
+    (tmp_path / "kafka.list").write_text(
+        "# comment\ndeb [arch=amd64] http://example.com/kafka focal main\n"
+    )
+
+    mapping = apt.RepositoryMapping.__new__(apt.RepositoryMapping)
+    mapping._repository_map, mapping._pending = {}, None
+    for path in (tmp_path / "debian.sources", tmp_path / "kafka.list"):
+        mapping.load(str(path))
+    return mapping, tmp_path
+
+
+def test_repository_mapping_parses_deb822_and_caches(sources, monkeypatch):
+    mapping, path = sources
+
+    assert len(mapping) == 6
+    updates = mapping["deb-src-http://deb.debian.org/debian-bookworm-updates"]
+    assert updates.groups == ["main", "contrib"]
+    assert updates.gpg_key == "/usr/share/keyrings/debian-archive-keyring.gpg"
+    security = mapping["deb-http://deb.debian.org/debian-security-bookworm-security"]
+    assert security.options == {"arch": "amd64,arm64"}
+
+    parsed = []
+    parse_stanza = apt._parse_deb822_stanza
+    monkeypatch.setattr(apt, "_parse_deb822_stanza", lambda s: parsed.append(s) or parse_stanza(s))
+    mapping.load(str(path / "debian.sources"))
+    assert not parsed
+
+    (path / "debian.sources").write_text(DEB822_SOURCES.replace("contrib", "non-free"))
+    mapping.load(str(path / "debian.sources"))
+    assert len(parsed) == 2
+    assert mapping["deb-http://deb.debian.org/debian-bookworm"].groups == ["main", "non-free"]
+
+
+def test_repository_mapping_adds_to_deb822_sources(sources):
+    mapping, path = sources
+    security = mapping["deb-http://deb.debian.org/debian-security-bookworm-security"]
+
+    mapping.add(security)
+    assert (path / "debian.sources").read_text() == DEB822_SOURCES
+
+    sources_file = str(path / "debian.sources")
+    mapping.add(
+        apt.DebianRepository(
+            True,
+            "deb",
+            "http://deb.debian.org/debian-security",
+            "bookworm-security",
+            ["main", "non-free-firmware"],
+            sources_file,
+            options={"arch": "amd64,arm64"},
+        )
+    )
+    mapping.add(
+        apt.DebianRepository(
+            True,
+            "deb",
+            "http://deb.debian.org/debian",
+            "bookworm-backports",
+            ["main"],
+            sources_file,
+        )
+    )
+
+    expected = DEB822_SOURCES.replace(
+        "Components: main\n", "Components: main non-free-firmware\n"
+    ) + (
+        "\nTypes: deb\nURIs: http://deb.debian.org/debian\nSuites: bookworm-backports\n"
+        "Components: main\n"
+    )
+    assert (path / "debian.sources").read_text() == expected
+
+    reloaded = apt.RepositoryMapping.__new__(apt.RepositoryMapping)
+    reloaded._repository_map, reloaded._pending = {}, None
+    reloaded.load(str(path / "debian.sources"))
+    assert len(reloaded) == 6
+    assert reloaded["deb-http://deb.debian.org/debian-security-bookworm-security"].options == {
+        "arch": "amd64,arm64"
+    }
+
+    updates = mapping["deb-http://deb.debian.org/debian-bookworm-updates"]
+    mapping.add(updates)
+    with pytest.raises(apt.InvalidSourceError):
+        mapping.add(
+            apt.DebianRepository(
+                False, "deb", updates.uri, updates.release, updates.groups, sources_file
+            )
+        )
+
+
+def test_repository_mapping_batches_writes(sources, monkeypatch):
+    mapping, path = sources
+    writes = []
+    write_file_atomic = apt._write_file_atomic
+    monkeypatch.setattr(
+        apt, "_write_file_atomic", lambda *args: writes.append(args[0]) or write_file_atomic(*args)
+    )
+
+    with pytest.raises(apt.InvalidSourceError):
+        mapping.disable(mapping["deb-http://deb.debian.org/debian-bookworm"])
+
+    with mapping.batch():
+        mapping.disable(mapping["deb-http://deb.debian.org/debian-security-bookworm-security"])
+        mapping.disable(mapping["deb-http://example.com/kafka-focal"])
+        assert not writes
+
+    assert sorted(writes) == [str(path / "debian.sources"), str(path / "kafka.list")]
+    assert (path / "debian.sources").read_text().endswith("arm64\nEnabled: no\n")
+    assert (
+        (path / "kafka.list")
+        .read_text()
+        .endswith("\n# deb [arch=amd64] http://example.com/kafka focal main\n")
+    )
+    assert sorted(p.name for p in path.iterdir()) == ["debian.sources", "kafka.list"]
+
+
+def test_forked_lookups_agree_with_native_reads(apt_system, monkeypatch):
+    apt_system.populate(installed=20, available=60, updates=0)
+    names = [apt_system.installed[3], apt_system.available[-1]]
+
+    native = [apt.DebianPackage.from_system(name) for name in names]
+    assert [p.present for p in native] == [True, False]
+    assert not apt_system.calls()
+
+    for name in ("DPKG_STATUS_PATH", "APT_LISTS_PATH"):
+        monkeypatch.setattr(apt, name, str(apt_system.root / "missing"))
+    monkeypatch.setattr(apt, "_dpkg_status", None)
+    monkeypatch.setattr(apt, "_package_lists", None)
+
+    forked = [apt.DebianPackage.from_system(name) for name in names]
+    assert [(p.fullversion, p.state) for p in forked] == [(p.fullversion, p.state) for p in native]
+    assert [c[:2] for c in apt_system.calls()] == [
+        ["dpkg", "-l"],
+        ["dpkg", "-l"],
+        ["apt-cache", "show"],
+    ]
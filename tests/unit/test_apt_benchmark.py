@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Benchmarks of the apt library against a fake Debian system of a realistic size."""
+
+import logging
+import random
+import time
+
+import pytest
+from charms.operator_libs_linux.v0 import apt
+from tests.unit.aptsystem import FakeAptSystem
+
+logger = logging.getLogger(__name__)
+
+INSTALLED = 5000
+AVAILABLE = 60000
+SOURCES = 200
+ROUNDS = 200
+FORKED_ROUNDS = 5
+RELOADS = 20
+
+
+@pytest.fixture()
+def large_apt_system(apt_system):
+    apt_system.populate(installed=INSTALLED, available=AVAILABLE, sources=SOURCES)
+    return apt_system
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+@pytest.mark.benchmark
+def test_from_system_without_forks(large_apt_system, monkeypatch):
+    names = random.Random(0).sample(large_apt_system.available, ROUNDS)
+
+    def lookups(names):
+        return lambda: [apt.DebianPackage.from_system(name) for name in names]
+
+    cold_time = _timed(lookups(names[:1]))
+    native_time = _timed(lookups(names))
+    native_forks = len(large_apt_system.calls())
+
+    for name in ("DPKG_STATUS_PATH", "APT_LISTS_PATH"):
+        monkeypatch.setattr(apt, name, str(large_apt_system.root / "missing"))
+    monkeypatch.setattr(apt, "_dpkg_status", None)
+    monkeypatch.setattr(apt, "_package_lists", None)
+    forked_time = _timed(lookups(names[:FORKED_ROUNDS]))
+    forked_forks = len(large_apt_system.calls())
+
+    logger.info(
+        f"{ROUNDS} lookups: {cold_time:.3f}s to index {INSTALLED} installed and {AVAILABLE} "
+        f"available packages, then {native_time / ROUNDS * 1000:.3f}ms per lookup; "
+        f"{forked_time / FORKED_ROUNDS * 1000:.1f}ms per lookup with {forked_forks} forks "
+        f"for {FORKED_ROUNDS} lookups"
+    )
+    assert native_forks == 0
+    assert forked_forks >= FORKED_ROUNDS
+
+
+@pytest.mark.benchmark
+def test_package_index_cached_on_disk(large_apt_system, monkeypatch):
+    name = large_apt_system.available[-1]
+
+    def lookup():
+        monkeypatch.setattr(apt, "_package_lists", None)
+        apt.DebianPackage.from_apt_cache(name)
+
+    cold_time = _timed(lookup)
+    cached_time = _timed(lookup)
+
+    logger.info(
+        f"{AVAILABLE} available packages: {cold_time:.3f}s to index the lists, "
+        f"{cached_time:.3f}s to reopen them from the on-disk index"
+    )
+    assert large_apt_system.index_cache_path.exists()
+    assert not large_apt_system.calls()
+
+
+@pytest.mark.benchmark
+def test_add_package_forks(large_apt_system):
+    names = large_apt_system.available[INSTALLED : INSTALLED + ROUNDS]
+
+    add_time = _timed(lambda: apt.add_package(names))
+    calls = large_apt_system.calls()
+
+    logger.info(f"add_package of {ROUNDS} packages: {add_time:.3f}s with {len(calls)} fork(s)")
+    assert [c[:3] for c in calls] == [
+        ["apt-get", "-y", "--option=Dpkg::Options::=--force-confold"]
+    ]
+    assert len(calls[0]) == 4 + ROUNDS
+
+
+@pytest.mark.benchmark
+def test_version_sorting():
+    rng = random.Random(0)
+    numbers = [FakeAptSystem.package_version(rng) for _ in range(AVAILABLE)]
+
+    def versions():
+        return [apt.Version(n.rpartition(":")[2], n.rpartition(":")[0]) for n in numbers]
+
+    apt._revision_key.cache_clear()
+    cold = versions()
+    cold_time = _timed(lambda: sorted(cold))
+    warm = versions()
+    warm_time = _timed(lambda: sorted(warm))
+    keyed = versions()
+    keyed_time = _timed(lambda: sorted(keyed, key=apt.Version.sort_key))
+
+    logger.info(
+        f"sorting {AVAILABLE} versions: {cold_time:.3f}s cold, {warm_time:.3f}s with cached "
+        f"revision keys, {keyed_time:.3f}s by sort key"
+    )
+    ordered = sorted(warm)
+    assert all(a <= b for a, b in zip(ordered, ordered[1:]))
+    assert [str(v) for v in sorted(keyed, key=apt.Version.sort_key)] == [str(v) for v in ordered]
+
+
+@pytest.mark.benchmark
+def test_repository_mapping_loading(large_apt_system, monkeypatch):
+    parsed = []
+    parse_stanza = apt._parse_deb822_stanza
+    monkeypatch.setattr(apt, "_parse_deb822_stanza", lambda s: parsed.append(s) or parse_stanza(s))
+
+    cold = []
+    cold_time = _timed(lambda: cold.append(apt.RepositoryMapping()))
+    cold_parsed = len(parsed)
+    warm_time = _timed(lambda: [apt.RepositoryMapping() for _ in range(RELOADS)])
+
+    logger.info(
+        f"{SOURCES} sources files: {cold_time * 1000:.1f}ms to parse, "
+        f"{warm_time / RELOADS * 1000:.2f}ms per cached reload"
+    )
+    # half of the files are deb822, each with two stanzas
+    assert cold_parsed == SOURCES
+    assert len(parsed) == cold_parsed
+    assert len(apt.RepositoryMapping()) == len(cold[0])
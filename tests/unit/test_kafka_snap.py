@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from charms.kafka.v0 import kafka_snap as kafka_snap_lib
+from charms.kafka.v0.kafka_snap import (
+    SNAP_CHANNEL,
+    KafkaSnap,
+    RestartTiming,
+    RollingRestartCoordinator,
+)
+from charms.operator_libs_linux.v1 import snap
+
+
+def test_install_skips_when_installed_at_channel(snapd):
+    snapd.add_installed_snap("kafka", channel=SNAP_CHANNEL, revision="42")
+    kafka_snap = KafkaSnap()
+
+    assert kafka_snap.install()
+    assert "revision 42" in kafka_snap.install_reason
+    assert not [r for r in snapd.requests if r[0] != "GET"]
+
+
+def test_install_installs_missing_snap(snapd):
+    snapd.add_store_snap("kafka", channel="latest/stable")
+    kafka_snap = KafkaSnap()
+
+    assert kafka_snap.install()
+    assert "not installed" in kafka_snap.install_reason
+    assert kafka_snap.kafka.present
+    assert snapd.installed["kafka"]["channel"] == SNAP_CHANNEL
+
+
+def test_install_keeps_classic_confinement(snapd):
+    snapd.add_store_snap("kafka", channel="latest/stable")
+    snapd.store["kafka"]["confinement"] = "classic"
+
+    assert KafkaSnap().install()
+    (install,) = [r[3] for r in snapd.requests if r[:2] == ("POST", "/v2/snaps/kafka")]
+    assert install == {"action": "install", "channel": SNAP_CHANNEL, "classic": True}
+
+
+def test_install_refreshes_other_channel(snapd, monkeypatch):
+    snapd.add_installed_snap("kafka", channel="latest/stable")
+    commands = []
+    monkeypatch.setattr(
+        snap.Snap,
+        "_snap",
+        lambda self, command, optargs=None: commands.append([command, *optargs]),
+    )
+    kafka_snap = KafkaSnap()
+
+    assert kafka_snap.install()
+    assert "tracking latest/stable" in kafka_snap.install_reason
+    assert commands == [["refresh", f'--channel="{SNAP_CHANNEL}"']]
+    assert not snapd.requests_to("POST", "snaps/kafka")
+
+
+def test_service_transitions_skip_noops(snapd, monkeypatch):
+    snapd.add_installed_snap("kafka", channel=SNAP_CHANNEL, services=["kafka"])
+    calls = []
+    for action in ("start", "stop", "restart"):
+        monkeypatch.setattr(
+            snap.Snap, action, lambda self, services, a=action, **kw: calls.append((a, services))
+        )
+    kafka_snap = KafkaSnap()
+
+    assert kafka_snap.start_snap_service("kafka")
+    for _ in range(3):
+        assert kafka_snap.restart_snap_service("kafka", coalesce=True)
+    assert kafka_snap.flush_restarts()
+    assert kafka_snap.stop_snap_service("kafka")
+    assert kafka_snap.stop_snap_service("kafka")
+
+    assert calls == [("restart", ["kafka"]), ("stop", ["kafka"])]
+
+
+def test_prefetch_then_switch_revision(snapd, monkeypatch, tmp_path):
+    snapd.add_installed_snap("kafka", channel=SNAP_CHANNEL, services=["kafka"])
+    downloads = tmp_path / "downloads"
+    monkeypatch.setattr(kafka_snap_lib, "SNAP_DOWNLOAD_PATH", str(downloads))
+    commands = []
+
+    def fake_snap(self, command, optargs=None):
+        commands.append([command, *(optargs or [])])
+        if command == "download":
+            (downloads / "kafka_43.snap").touch()
+            (downloads / "kafka_43.assert").touch()
+        return ""
+
+    monkeypatch.setattr(snap.Snap, "_snap", fake_snap)
+    monkeypatch.setattr(snap.subprocess, "check_output", lambda cmd, **kw: commands.append(cmd))
+    kafka_snap = KafkaSnap()
+
+    cohort = kafka_snap.create_cohort()
+    assert kafka_snap.prefetch(cohort)
+    assert kafka_snap.switch_revision(cohort)
+
+    assert commands[0][0] == "download" and f"--cohort={cohort}" in commands[0]
+    assert commands[1] == ["snap", "ack", str(downloads / "kafka_43.assert")]
+    assert commands[2] == ["snap", "install", str(downloads / "kafka_43.snap")]
+    assert commands[3][0] == "refresh"
+    assert not list(downloads.iterdir())
+
+
+@pytest.fixture()
+def kafka_bin(monkeypatch, tmp_path):
+    """A fake `kafka.topics` app on PATH, printing its args and `KAFKA_OPTS`."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    app = bin_dir / "kafka.topics"
+    app.write_text(
+        '#!/bin/sh\n[ "$1" != --fail ] || { echo failed >&2; exit 3; }\n'
+        'printf "%s|" "$@"\necho "$KAFKA_OPTS"\n'
+    )
+    app.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir))
+    return app
+
+
+def test_build_bin_command(kafka_bin, monkeypatch):
+    monkeypatch.setenv("KEPT", "1")
+
+    command, env = KafkaSnap._build_bin_command("topics", ["--list"], ["-Da=1", "-Db=2"])
+    assert command == [str(kafka_bin), "--list"]
+    assert env["KAFKA_OPTS"] == "-Da=1 -Db=2" and env["KEPT"] == "1"
+
+    command, _ = KafkaSnap._build_bin_command("configs", [], [])
+    assert command == [f"{kafka_snap_lib.SNAP_BIN_PATH}/kafka.configs"]
+
+
+def test_run_bin_command_parses_args_with_shell(kafka_bin):
+    output = KafkaSnap.run_bin_command("topics", ["--describe --topic", "'a b'"], ["-Da", "-Db"])
+
+    assert output == "--describe|--topic|a b|-Da -Db\n"
+
+
+def test_run_bin_argv_passes_args_verbatim(kafka_bin):
+    output = KafkaSnap.run_bin_argv("topics", ["--topic", "a b", "'c'"], ["-Da"])
+
+    assert output == "--topic|a b|'c'|-Da\n"
+
+
+def test_run_bin_commands(kafka_bin):
+    outputs = KafkaSnap.run_bin_commands([("topics", ["--list"]), ("topics", ["a b"])], ["-Da"])
+    assert outputs == ["--list|-Da\n", "a b|-Da\n"]
+
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        KafkaSnap.run_bin_commands([("topics", ["--list"]), ("topics", ["--fail"])], [])
+    assert e.value.returncode == 3
+    assert e.value.cmd == [str(kafka_bin), "--fail"]
+    assert e.value.stderr == "failed\n"
+
+
+DESCRIBE_OUTPUT = """\
+Topic: events\tTopicId: 7GxkZ5ZRQ1K\tPartitionCount: 3\tReplicationFactor: 3\tConfigs:
+\tTopic: events\tPartition: 0\tLeader: 1\tReplicas: 1,2,3\tIsr: 1,2
+\tTopic: events\tPartition: 2\tLeader: 3\tReplicas: 3,1,2\tIsr: 3
+"""
+
+
+class FakeClock:
+    """Stands in for the `time` module, with `sleep` advancing `monotonic`."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture()
+def cluster(monkeypatch):
+    """A stubbed `KafkaSnap`, reporting the (under-replicated, unavailable) counts in `health`.
+
+    A `None` count makes the describe command fail.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(kafka_snap_lib, "time", clock)
+
+    def run_bin_commands(commands, opts):
+        stub.commands.append(commands)
+        counts = stub.health.pop(0) if len(stub.health) > 1 else stub.health[0]
+        if None in counts:
+            raise subprocess.CalledProcessError(1, "kafka.topics")
+        return ["".join(f"Topic: t\tPartition: {i}\n" for i in range(n)) for n in counts]
+
+    def restart_snap_service(snap_service):
+        stub.restarted.append(snap_service)
+        clock.sleep(2)
+        return True
+
+    stub = SimpleNamespace(
+        clock=clock,
+        health=[(0, 0)],
+        commands=[],
+        restarted=[],
+        run_bin_commands=run_bin_commands,
+        restart_snap_service=restart_snap_service,
+    )
+    return stub
+
+
+def test_count_partitions_ignores_topic_headers():
+    assert RollingRestartCoordinator._count_partitions(DESCRIBE_OUTPUT) == 2
+    assert RollingRestartCoordinator._count_partitions("") == 0
+
+
+def test_wait_until_stable_resets_stable_checks(cluster):
+    cluster.health = [(0, 0), (0, 0), (1, 0), (None, None), (0, 0), (0, 2), (0, 0), (0, 0)]
+    coordinator = RollingRestartCoordinator(
+        cluster, "10.0.0.1:9092", [], command_config="client.properties", poll_interval=1
+    )
+
+    assert coordinator.wait_until_stable()
+    assert len(cluster.commands) == 9
+    assert cluster.clock.now == 8
+    (under_replicated, unavailable) = cluster.commands[0]
+    assert under_replicated == (
+        "topics",
+        [
+            "--bootstrap-server",
+            "10.0.0.1:9092",
+            "--describe",
+            "--under-replicated-partitions",
+            "--command-config",
+            "client.properties",
+        ],
+    )
+    assert "--unavailable-partitions" in unavailable[1]
+
+
+def test_restart_skipped_when_cluster_not_stable(cluster):
+    cluster.health = [(0, 1)]
+    coordinator = RollingRestartCoordinator(
+        cluster, "10.0.0.1:9092", [], timeout=30, poll_interval=5
+    )
+
+    assert not coordinator.restart("kafka")
+    assert not cluster.restarted and not coordinator.timings
+    assert cluster.clock.now == 30
+
+
+def test_restart_records_timing(cluster):
+    cluster.health = [(1, 0), (0, 0), (0, 1), (0, 1), (0, 0)]
+    coordinator = RollingRestartCoordinator(
+        cluster, "10.0.0.1:9092", [], poll_interval=5, stable_checks=1
+    )
+
+    assert coordinator.restart("kafka")
+    assert cluster.restarted == ["kafka"]
+    assert coordinator.timings == [RestartTiming("kafka", pre_check=5, restart=2, recovery=10)]
+    assert coordinator.timings[0].total == 17
+
+    cluster.health = [(0, 0), (0, 1)]
+    coordinator.timeout = 10
+    assert not coordinator.restart("kafka")
+    assert coordinator.timings[1] == RestartTiming("kafka", pre_check=0, restart=2, recovery=10)
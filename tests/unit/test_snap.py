@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import time
+
+import pytest
+from charms.operator_libs_linux.v1 import snap
+
+
+def test_lazy_cache_only_fetches_requested_snaps(snapd):
+    snapd.add_installed_snap("kafka", channel="rock/edge")
+    snapd.add_installed_snap("juju")
+
+    cache = snap.SnapCache(lazy=True)
+    kafka = cache["kafka"]
+
+    assert kafka.present
+    assert kafka.channel == "rock/edge"
+    assert [r[:2] for r in snapd.requests] == [("GET", "/v2/snaps/kafka")]
+
+
+def test_eager_cache_loads_installed_snaps(snapd):
+    snapd.add_installed_snap("kafka")
+    snapd.add_installed_snap("juju")
+
+    cache = snap.SnapCache()
+
+    assert cache["kafka"].present and cache["juju"].present
+    assert snapd.requests_to("GET", "snaps") == 1
+
+
+def test_lazy_cache_falls_back_to_store(snapd):
+    snapd.add_store_snap("kafka", channel="rock/edge")
+
+    kafka = snap.SnapCache(lazy=True)["kafka"]
+
+    assert kafka.state == snap.SnapState.Available
+    assert snapd.requests_to("GET", "find") == 1
+
+
+def test_unknown_snap_not_found(snapd):
+    with pytest.raises(snap.SnapNotFoundError):
+        snap.SnapCache(lazy=True)["unknown"]
+
+
+def test_client_reuses_connection(snapd):
+    snapd.add_installed_snap("kafka", services=["kafka"])
+
+    for _ in range(10):
+        snap.SnapClient().get_installed_snap("kafka")
+        snap.SnapClient().get_installed_snap_apps("kafka")
+
+    assert snapd.connections == 1
+
+
+@pytest.mark.parametrize("check_dropped", [True, False])
+def test_client_posts_after_server_closed_connection(snapd, monkeypatch, check_dropped):
+    snapd.add_installed_snap("kafka")
+    snapd.close_idle = True
+    if not check_dropped:
+        monkeypatch.setattr(
+            snap._UnixSocketConnectionPool, "_is_dropped", staticmethod(lambda sock: False)
+        )
+
+    snap.SnapClient().get_installed_snap("kafka")
+    deadline = time.monotonic() + 5
+    while not snapd.disconnections and time.monotonic() < deadline:
+        time.sleep(0.01)
+    snap.SnapClient().snap_action("kafka", "refresh")
+
+    assert snapd.requests_to("POST", "snaps/kafka") == 1
+    assert snapd.connections == 2
+
+
+def test_client_raises_api_error(snapd):
+    with pytest.raises(snap.SnapAPIError) as e:
+        snap.SnapClient().get_installed_snap("kafka")
+
+    assert e.value.code == 404
+
+
+def test_shared_cache_invalidated_by_change(snapd):
+    snapd.add_installed_snap("kafka")
+    snapd.add_store_snap("juju")
+
+    for _ in range(5):
+        snap.get_cache()["kafka"]
+    assert snapd.requests_to("GET", "snaps/kafka") == 1
+
+    (juju,) = snap.add_many(["juju"], channel="3/stable")
+
+    assert juju.present
+    assert snap.get_cache()["kafka"].present
+    assert snapd.requests_to("GET", "snaps/kafka") == 2
+
+
+def test_add_several_snaps(snapd, monkeypatch):
+    snapd.add_store_snap("kafka")
+    snapd.add_store_snap("juju")
+    commands = []
+
+    def fake_snap(self, command, optargs=None):
+        commands.append([command, self.name, *(optargs or [])])
+        snapd.add_installed_snap(self.name, channel="edge")
+        return ""
+
+    monkeypatch.setattr(snap.Snap, "_snap", fake_snap)
+
+    kafka, juju = snap.add(["kafka", "juju"], channel="edge")
+
+    assert kafka.present and juju.present
+    assert commands == [
+        ["install", "kafka", '--channel="edge"'],
+        ["install", "juju", '--channel="edge"'],
+    ]
+
+
+def test_add_many_without_options_uses_one_change(snapd):
+    snapd.add_store_snap("kafka")
+    snapd.add_store_snap("juju")
+
+    snaps = snap.add_many(["kafka", "juju"])
+
+    assert all(s.present for s in snaps)
+    assert snapd.requests_to("POST", "snaps") == 1
+    assert len(snapd.changes) == 1
+
+
+def test_add_many_with_channel_uses_one_change_per_snap(snapd):
+    snapd.change_polls = 2
+    snapd.add_store_snap("kafka")
+    snapd.add_store_snap("juju")
+
+    snaps = snap.add_many(["kafka", "juju"], channel="edge")
+
+    assert [s.channel for s in snaps] == ["edge", "edge"]
+    assert snapd.requests_to("POST", "snaps/kafka") == 1
+    assert snapd.requests_to("POST", "snaps/juju") == 1
+
+
+def test_wait_changes_reports_failures(snapd):
+    snapd.add_store_snap("kafka")
+    client = snap.SnapClient()
+    changes = [client.snap_action("kafka", "install"), client.snap_action("juju", "install")]
+
+    with pytest.raises(snap.SnapError, match="cannot install 'juju'"):
+        client.wait_changes(changes)
+
+    assert "kafka" in snapd.installed
+
+
+def test_wait_changes_times_out(snapd):
+    snapd.add_store_snap("kafka")
+    snapd.change_polls = 1000
+    client = snap.SnapClient()
+
+    with pytest.raises(snap.SnapError, match="Timed out"):
+        client.wait_change(client.snap_action("kafka", "install"), timeout=0.3)
+
+
+def test_create_cohort(snapd):
+    snapd.add_installed_snap("kafka")
+
+    assert snap.SnapCache(lazy=True)["kafka"].create_cohort() == "cohort-kafka"
+    assert snapd.requests[-1][3] == {"action": "create", "snaps": ["kafka"]}
+
+
+def test_update_config_only_writes_changed_keys(snapd):
+    snapd.add_installed_snap("kafka")
+    snapd.config["kafka"] = {"log": {"level": "INFO", "dir": "/var/log"}, "port": 9092}
+    kafka = snap.SnapCache(lazy=True)["kafka"]
+
+    assert not kafka.update_config({"log.level": "INFO", "port": 9092})
+    assert kafka.update_config({"log": {"level": "DEBUG"}, "port": 9092, "unset": None})
+
+    puts = [r[3] for r in snapd.requests if r[0] == "PUT"]
+    assert puts == [{"log.level": "DEBUG"}]
+    assert kafka.get_config() == {"log": {"level": "DEBUG", "dir": "/var/log"}, "port": 9092}
+
+
+def test_update_config_wraps_change_errors(snapd, monkeypatch):
+    snapd.add_installed_snap("kafka")
+    kafka = snap.SnapCache(lazy=True)["kafka"]
+
+    def missing_change(change_id):
+        raise KeyError(change_id)
+
+    monkeypatch.setattr(snapd, "_get_change", missing_change)
+    with pytest.raises(snap.SnapError, match="Could not set config for snap"):
+        kafka.update_config({"port": 9092})
+
+
+def test_request_restart_and_wait_for_services(snapd):
+    snapd.add_installed_snap("kafka", services=["kafka", "zookeeper"])
+    kafka = snap.SnapCache(lazy=True)["kafka"]
+    client = snap.SnapClient()
+
+    client.wait_change(kafka.request_stop(services=["zookeeper"]))
+    kafka.wait_for_services({"kafka": "active", "zookeeper": "inactive"}, timeout=1)
+
+    with pytest.raises(snap.SnapError, match="zookeeper active"):
+        kafka.wait_for_services({"zookeeper": "active"}, timeout=0.3)
+
+    assert any(r[3] == {"action": "stop", "names": ["kafka.zookeeper"]} for r in snapd.requests)
+
+
+def test_stream_logs(snapd):
+    snapd.add_installed_snap("kafka", services=["kafka", "zookeeper"])
+    snapd.logs = [
+        {"timestamp": "2026-01-01T00:00:0{}.123456789Z".format(i), "sid": sid, "message": str(i)}
+        for i, sid in enumerate(["kafka.kafka", "kafka.zookeeper", "kafka.kafka"])
+    ]
+    kafka = snap.SnapCache(lazy=True)["kafka"]
+
+    records = list(kafka.stream_logs(services=["kafka"]))
+
+    assert [r.message for r in records] == ["0", "2"]
+    assert records[1].timestamp.second == 2
+    assert records[1].timestamp.microsecond == 123456
+
+
+@pytest.mark.parametrize(
+    "timestamp, expected",
+    [
+        ("2026-01-01T00:00:00Z", "2026-01-01T00:00:00+00:00"),
+        ("2026-01-01T00:00:00-05:00", "2026-01-01T00:00:00-05:00"),
+        ("2026-01-01T00:00:00.123456789+02:00", "2026-01-01T00:00:00.123456+02:00"),
+        ("2026-01-01T00:00:00.5-05:00", "2026-01-01T00:00:00.500000-05:00"),
+        ("2026-01-01T00:00:00", "2026-01-01T00:00:00+00:00"),
+    ],
+)
+def test_log_timestamps(timestamp, expected):
+    assert snap.SnapLogRecord._parse_timestamp(timestamp).isoformat() == expected
+
+
+def test_instrumentation_hook(snapd):
+    snapd.add_installed_snap("kafka")
+    metrics = snap.SnapMetrics()
+    snap.add_instrumentation_hook(metrics)
+    try:
+        snap.SnapClient().get_installed_snap("kafka")
+        with pytest.raises(snap.SnapAPIError):
+            snap.SnapClient().get_installed_snap("juju")
+    finally:
+        snap.remove_instrumentation_hook(metrics)
+
+    summary = metrics.summary()
+    assert summary["api GET snaps/kafka"]["count"] == 1
+    assert summary["api GET snaps/kafka"]["bytes"] > 0
+    assert summary["api GET snaps/juju"]["errors"] == 1
+
+
+def test_install_downloaded_is_instrumented(snapd, monkeypatch):
+    snapd.add_installed_snap("kafka")
+    commands = []
+    monkeypatch.setattr(
+        snap.subprocess, "check_output", lambda cmd, **kw: commands.append(cmd) or ""
+    )
+    metrics = snap.SnapMetrics()
+    snap.add_instrumentation_hook(metrics)
+    try:
+        snap.SnapCache(lazy=True)["kafka"].install_downloaded("kafka_43.snap", "kafka_43.assert")
+    finally:
+        snap.remove_instrumentation_hook(metrics)
+
+    assert commands == [["snap", "ack", "kafka_43.assert"], ["snap", "install", "kafka_43.snap"]]
+    summary = metrics.summary()
+    assert summary["cli snap ack"]["count"] == summary["cli snap install"]["count"] == 1
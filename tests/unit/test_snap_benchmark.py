@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Benchmarks of the snap library against a fake snapd with per-request latency."""
+
+import logging
+import time
+
+import pytest
+from charms.operator_libs_linux.v1 import snap
+
+logger = logging.getLogger(__name__)
+
+LATENCY = 0.002
+ROUNDS = 50
+
+
+@pytest.fixture()
+def slow_snapd(snapd):
+    for name in ("kafka", "zookeeper", "juju", "lxd", "core22"):
+        snapd.add_installed_snap(name, services=[name])
+    snapd.latency = LATENCY
+    return snapd
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+@pytest.mark.benchmark
+def test_connection_reuse(slow_snapd):
+    opener = snap.SnapClient._get_default_opener(slow_snapd.socket_path)
+    per_request = snap.SnapClient(opener=opener)
+    pooled = snap.SnapClient()
+
+    def lookups(client):
+        return lambda: [client.get_installed_snap_apps("kafka") for _ in range(ROUNDS)]
+
+    per_request_time = _timed(lookups(per_request))
+    per_request_connections = slow_snapd.connections
+    pooled_time = _timed(lookups(pooled))
+    pooled_connections = slow_snapd.connections - per_request_connections
+
+    logger.info(
+        f"{ROUNDS} requests: {per_request_time:.3f}s on {per_request_connections} connections, "
+        f"{pooled_time:.3f}s on {pooled_connections} pooled connection(s)"
+    )
+    assert per_request_connections == ROUNDS
+    assert pooled_connections == 1
+
+
+@pytest.mark.benchmark
+def test_cache_hit_rate(slow_snapd):
+    names = ["kafka", "zookeeper", "juju", "lxd", "core22"]
+
+    def fresh_caches():
+        for _ in range(ROUNDS):
+            snap.SnapCache()[names[0]]
+
+    def shared_cache():
+        for i in range(ROUNDS):
+            snap.get_cache()[names[i % len(names)]]
+
+    fresh_time = _timed(fresh_caches)
+    fresh_requests = len(slow_snapd.requests)
+    shared_time = _timed(shared_cache)
+    shared_requests = len(slow_snapd.requests) - fresh_requests
+    hit_rate = 1 - shared_requests / ROUNDS
+
+    logger.info(
+        f"{ROUNDS} lookups: {fresh_time:.3f}s with fresh caches ({fresh_requests} requests), "
+        f"{shared_time:.3f}s with the shared cache ({shared_requests} requests, "
+        f"{hit_rate:.0%} hit rate)"
+    )
+    assert shared_requests == len(names)